@@ -1 +1 @@
-from app.models import user, savings, transaction, watchlist
\ No newline at end of file
+from app.models import user, savings, savings_summary, transaction, watchlist, chat
\ No newline at end of file
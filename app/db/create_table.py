@@ -4,6 +4,6 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.db.database import engine, Base
-from app.models import user, savings, transaction, watchlist
+from app.models import user, savings, savings_summary, transaction, watchlist, chat
 
 Base.metadata.create_all(bind=engine)
@@ -0,0 +1,156 @@
+# query diagnostics, installed when DB_DIAGNOSTICS=true (see app/db/database.py): records every statement per request,
+# flags statements repeated within one request (N+1 patterns), logs slow queries with
+# their parameters and EXPLAIN plan, and reports a per-request summary in the
+# X-DB-Query-Budget response header.
+
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.services.metrics import Counter, route_template
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# the same statement this many times in one request counts as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "20"))
+EXPLAIN_SLOW_QUERIES = os.getenv("DB_EXPLAIN_SLOW_QUERIES", "true").lower() in ("1", "true", "yes")
+
+SLOW_QUERIES = Counter("db_slow_queries_total", "SQL statements slower than DB_SLOW_QUERY_MS.")
+N_PLUS_ONE = Counter("db_n_plus_one_total", "Requests that repeated one statement DB_N_PLUS_ONE_THRESHOLD+ times.", ("route",))
+OVER_BUDGET = Counter("db_query_budget_exceeded_total", "Requests that ran more than DB_QUERY_BUDGET statements.", ("route",))
+
+
+@dataclass
+class QueryLog:
+    # statement text -> [executions, total seconds]
+    statements: dict = field(default_factory=dict)
+    count: int = 0
+    total_time: float = 0.0
+    slow: int = 0
+
+    def record(self, statement: str, elapsed: float) -> None:
+        entry = self.statements.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        self.count += 1
+        self.total_time += elapsed
+
+    def repeated(self) -> dict:
+        return {s: entry for s, entry in self.statements.items() if entry[0] >= N_PLUS_ONE_THRESHOLD}
+
+
+_current_log: ContextVar[Optional[QueryLog]] = ContextVar("db_query_log", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(statement: str) -> str:
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    # raw DBAPI cursor, so this doesn't go through (and re-trigger) the engine events
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" | ".join(str(col) for col in row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._diagnostics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_diagnostics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    normalized = _normalize(statement)
+
+    log = _current_log.get()
+    if log is not None:
+        log.record(normalized, elapsed)
+
+    if elapsed * 1000 < SLOW_QUERY_MS:
+        return
+    SLOW_QUERIES.inc()
+    if log is not None:
+        log.slow += 1
+
+    plan = ""
+    # a second cursor can't be used while a server side cursor is still streaming rows
+    streaming = context.execution_options.get("stream_results") or context.execution_options.get("yield_per")
+    if EXPLAIN_SLOW_QUERIES and not executemany and not streaming and normalized.upper().startswith("SELECT"):
+        try:
+            plan = "\n" + _explain(conn, statement, parameters)
+        except Exception as e:
+            plan = f"\n(EXPLAIN failed: {e})"
+    logger.warning("Slow query (%.1f ms): %s params=%r%s", elapsed * 1000, normalized, parameters, plan)
+
+
+def install_diagnostics(engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryDiagnosticsMiddleware:
+    """
+    Collects the statements run while handling a request and adds
+    `X-DB-Query-Budget: queries=..; budget=..; time_ms=..; repeated=..; slow=..` to the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = _current_log.set(log)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                summary = (
+                    f"queries={log.count}; budget={QUERY_BUDGET}; time_ms={log.total_time * 1000:.1f}; "
+                    f"repeated={len(log.repeated())}; slow={log.slow}"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"x-db-query-budget", summary.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_log.reset(token)
+            self._report(scope, log)
+
+    @staticmethod
+    def _report(scope, log: QueryLog) -> None:
+        route = route_template(scope)
+        repeated = log.repeated()
+        if repeated:
+            N_PLUS_ONE.inc(route=route)
+        for statement, (count, seconds) in repeated.items():
+            logger.warning(
+                "Possible N+1 in %s %s: statement ran %d times (%.1f ms): %s",
+                scope["method"], route, count, seconds * 1000, statement,
+            )
+        if log.count > QUERY_BUDGET:
+            OVER_BUDGET.inc(route=route)
+            logger.warning(
+                "%s %s ran %d queries (budget %d, %.1f ms)",
+                scope["method"], route, log.count, QUERY_BUDGET, log.total_time * 1000,
+            )
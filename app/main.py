@@ -1,13 +1,71 @@
 # this is where the FastAPI (exposes py logic to frontend) initializes.
 
+import asyncio
+from contextlib import asynccontextmanager
+
+# first, so the startup report's clock includes every other import
+from app.services.startup import startup_report
+
+import os
 from dotenv import load_dotenv
 load_dotenv()
-from fastapi import FastAPI
-from app.routes import user, finance, ai_chat, savings, transaction, stocks, dashboard, watchlist
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
+from app.routes import user, finance, ai_chat, savings, transaction, stocks, dashboard, watchlist, metrics, health
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.user import router as user_router
+from app.db import database
+from app.db.database import dispose_engines, DB_DIAGNOSTICS
+from app.services import stocks as stocks_service
+from app.services import openai_agent
+from app.services import passwords
+from app.services import transaction_log
+from app.services.quote_stream import quote_hub
+from app.services.metrics import MetricsMiddleware, configure_logging
+from app.services.ratelimit import UpstreamBusy
+
+
+# open connections to Twelve Data / OpenAI before reporting ready (off by default, it makes calls upstream)
+WARM_UPSTREAMS = os.getenv("WARM_UPSTREAMS", "false").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # everything a worker needs is created here, before it reports ready (see /health/startup)
+    startup_report.mark("imports")
+    if database.DB_CREATE_ALL:
+        with startup_report.phase("schema"):
+            await asyncio.to_thread(database.create_schema)
+    with startup_report.phase("db_pool"):
+        await asyncio.to_thread(database.warm_pool)
+    # long-lived upstream clients, shared by every request of this worker
+    with startup_report.phase("http_client"):
+        await stocks_service.start_client()
+    # not required: without an API key only the chat routes fail
+    with startup_report.phase("llm_client", required=False):
+        openai_agent.get_client()
+    if passwords.HASH_WARM:
+        with startup_report.phase("password_workers"):
+            await asyncio.to_thread(passwords.start)
+    if WARM_UPSTREAMS:
+        with startup_report.phase("upstreams", required=False):
+            await asyncio.gather(stocks_service.warm_up(), openai_agent.warm_up())
+    startup_report.finish()
+    yield
+    startup_report.ready = False
+    await quote_hub.close()
+    await stocks_service.close_client()
+    await openai_agent.close_client()
+    # flush buffered log entries while the engine is still usable
+    transaction_log.shutdown()
+    await dispose_engines()
+    passwords.shutdown()
 
-app = FastAPI()
+
+configure_logging()
+
+# orjson renders every response_model-validated body
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,7 +73,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "X-DB-Query-Budget", "Retry-After"],
 )
+if DB_DIAGNOSTICS:
+    from app.db.diagnostics import QueryDiagnosticsMiddleware
+
+    app.add_middleware(QueryDiagnosticsMiddleware)
+# outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(UpstreamBusy)
+async def upstream_busy(request: Request, exc: UpstreamBusy):
+    # shed before calling the provider: tell the client when it's worth trying again
+    return ORJSONResponse(
+        {"detail": str(exc), "provider": exc.provider, "retry_after": exc.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 
@@ -28,3 +103,5 @@ app.include_router(transaction.router, prefix="/transaction")
 app.include_router(stocks.router)
 app.include_router(dashboard.router, prefix="/dashboard", tags=["Dashboard"])
 app.include_router(watchlist.router, prefix="/stocks", tags=["Watchlist"])
+app.include_router(metrics.router, tags=["Metrics"])
+app.include_router(health.router, tags=["Health"])
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
+from datetime import datetime
+from app.db.database import Base
+
+
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+    # a user's sessions are listed most recently used first
+    __table_args__ = (
+        Index("ix_chat_sessions_user_id_updated_at", "user_id", "updated_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    title = Column(String(255), nullable=True)
+    # rolling summary of the turns that no longer fit the history budget
+    summary = Column(Text, nullable=True)
+    # last message folded into the summary, later ones are sent as they are
+    summarized_through = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_session_id_id", "session_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False)
+    role = Column(String(20), nullable=False)  # user / assistant
+    content = Column(Text, nullable=False)
+    # estimated size of content, what the history budget is counted in
+    tokens = Column(Integer, nullable=False, default=0)
+    # measured by the provider, on assistant turns: the whole prompt sent and the reply
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
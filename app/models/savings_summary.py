@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey
+from app.db.database import Base
+
+
+# per-user totals, kept up to date by the savings routes so the dashboard doesn't scan every goal
+class SavingsSummary(Base):
+    __tablename__ = "savings_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_saved = Column(Float, nullable=False, default=0.0)
+    active_goals = Column(Integer, nullable=False, default=0)
+    goal_count = Column(Integer, nullable=False, default=0)
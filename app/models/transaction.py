@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.database import Base
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    # history is read per user, newest first (InnoDB appends the primary key, so this also covers (timestamp, id))
+    __table_args__ = (
+        Index("ix_transactions_user_id_timestamp", "user_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -9,6 +9,3 @@ class WatchlistItem(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     symbol = Column(String(255))
     company_name = Column(String(255))
-
-    class Config:
-        orm_mode = True
\ No newline at end of file
@@ -1,21 +1,201 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from app.services.openai_agent import get_financial_advice_from_chatbot
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.db.database import get_db
+from app.models.chat import ChatMessage, ChatSession
+from app.schemas.chat import (
+    CacheStats, ChatMessagePage, ChatRequest, ChatResponse, ChatSessionCreate, ChatSessionDetail, ChatSessionOut,
+    ChatTurn,
+)
+from app.schemas.common import Message
+from app.services import chat_memory
+from app.services.auth import Principal, get_admin_user, get_current_user_id
+from app.services.openai_agent import (
+    complete_chat,
+    get_financial_advice_from_chatbot,
+    stream_chat,
+    stream_financial_advice_from_chatbot,
+    get_chat_cache_stats,
+)
+from app.services.pagination import MAX_PAGE_SIZE, decode_id_cursor, encode_cursor
+from app.services.ratelimit import UpstreamBusy
+from app.services.serialization import json_response
+from app.services.sse import SSE_HEADERS, sse_event
 
 router = APIRouter(prefix="/ai", tags=["AI Chat"])
 
+SESSION_COLUMNS = (ChatSession.id, ChatSession.title, ChatSession.created_at, ChatSession.updated_at)
+MESSAGE_COLUMNS = (
+    ChatMessage.id, ChatMessage.role, ChatMessage.content,
+    ChatMessage.prompt_tokens, ChatMessage.completion_tokens, ChatMessage.created_at,
+)
+
+
+def _advice_error(e: Exception) -> HTTPException:
+    return HTTPException(status_code=502, detail=f"Couldn't generate advice at the moment. Error: {str(e)}")
+
 
-class ChatRequest(BaseModel):
-    message: str
+def _error_event(e: Exception) -> str:
+    if isinstance(e, UpstreamBusy):
+        # the 200 is already sent, so the Retry-After goes in the event
+        return sse_event({"detail": str(e), "retry_after": e.retry_after}, event="error")
+    return sse_event({"detail": _advice_error(e).detail}, event="error")
 
 
-class ChatResponse(BaseModel):
-    reply: str
+async def advice_events(message: str):
+    # one "token" event per chunk of text, then "done" (or "error" if the model call failed midway)
+    try:
+        async for delta in stream_financial_advice_from_chatbot(message):
+            yield sse_event({"delta": delta}, event="token")
+    except Exception as e:
+        yield _error_event(e)
+        return
+    yield sse_event({}, event="done")
+
+
+def advice_stream_response(message: str) -> StreamingResponse:
+    return StreamingResponse(advice_events(message), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 @router.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest):
-    response = get_financial_advice_from_chatbot(request.message)
-    if response.startswith("Sorry"):
-        raise HTTPException(status_code=500, detail=response)
+async def chat(request: ChatRequest):
+    try:
+        response = await get_financial_advice_from_chatbot(request.message)
+    except UpstreamBusy:
+        raise  # 503 + Retry-After
+    except Exception as e:
+        raise _advice_error(e)
     return ChatResponse(reply=response)
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    return advice_stream_response(request.message)
+
+
+# admins only, like /cache/stats
+@router.get("/cache/stats", response_model=CacheStats)
+def chat_cache_stats(admin: Principal = Depends(get_admin_user)):
+    return get_chat_cache_stats()
+
+
+@router.post("/sessions", response_model=ChatSessionOut, status_code=201)
+def create_chat_session(
+        data: Optional[ChatSessionCreate] = None,
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    return chat_memory.create_session(db, user_id, data.title if data else None)
+
+
+@router.get("/sessions", response_model=List[ChatSessionOut])
+def list_chat_sessions(
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    rows = db.query(*SESSION_COLUMNS).filter(ChatSession.user_id == user_id).order_by(
+        ChatSession.updated_at.desc(), ChatSession.id.desc()).limit(limit).all()
+    return json_response(List[ChatSessionOut], rows)
+
+
+@router.get("/sessions/{session_id}", response_model=ChatSessionDetail)
+def get_chat_session(
+        session_id: int,
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    return chat_memory.get_session(db, user_id, session_id)
+
+
+@router.delete("/sessions/{session_id}", response_model=Message)
+def delete_chat_session(
+        session_id: int,
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    chat_memory.delete_session(db, user_id, session_id)
+    return {"message": "Chat session deleted"}
+
+
+@router.get("/sessions/{session_id}/messages", response_model=ChatMessagePage)
+def get_chat_messages(
+        session_id: int,
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    # newest first, each page continues with older messages
+    session = chat_memory.get_session(db, user_id, session_id)
+    filters = [ChatMessage.session_id == session.id]
+    before = decode_id_cursor(cursor)
+    if before is not None:
+        filters.append(ChatMessage.id < before)
+    rows = db.query(*MESSAGE_COLUMNS).filter(*filters).order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return json_response(ChatMessagePage, {"items": rows, "next_cursor": next_cursor})
+
+
+@router.post("/sessions/{session_id}/messages", response_model=ChatTurn)
+async def send_chat_message(
+        session_id: int,
+        request: ChatRequest,
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    """
+    One turn of a session: the model sees the user's goals and watchlist, a summary of older
+    turns and the recent ones that fit CHAT_HISTORY_TOKEN_BUDGET.
+    """
+    turn = await run_in_threadpool(chat_memory.prepare_turn, db, user_id, session_id, request.message)
+    try:
+        reply, usage = await complete_chat(turn.messages)
+    except UpstreamBusy:
+        raise  # 503 + Retry-After
+    except Exception as e:
+        raise _advice_error(e)
+    message_id = await run_in_threadpool(chat_memory.record_turn, turn.session_id, request.message, reply, usage)
+    if message_id is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    chat_memory.schedule_summary(turn)
+    return {"session_id": turn.session_id, "message_id": message_id, "reply": reply, "usage": usage}
+
+
+async def session_events(turn: chat_memory.PreparedTurn, message: str):
+    # like advice_events; the turn is stored once the reply is complete, "done" carries its token counts
+    parts, usage = [], {}
+    try:
+        async for delta in stream_chat(turn.messages, usage):
+            parts.append(delta)
+            yield sse_event({"delta": delta}, event="token")
+    except Exception as e:
+        yield _error_event(e)
+        return
+    message_id = await run_in_threadpool(chat_memory.record_turn, turn.session_id, message, "".join(parts), usage)
+    if message_id is None:
+        # deleted while the reply was streaming
+        yield sse_event({"detail": "Chat session not found"}, event="error")
+        return
+    chat_memory.schedule_summary(turn)
+    yield sse_event({"message_id": message_id, "usage": usage}, event="done")
+
+
+@router.post("/sessions/{session_id}/messages/stream")
+async def stream_chat_message(
+        session_id: int,
+        request: ChatRequest,
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    turn = await run_in_threadpool(chat_memory.prepare_turn, db, user_id, session_id, request.message)
+    return StreamingResponse(
+        session_events(turn, request.message), media_type="text/event-stream", headers=SSE_HEADERS
+    )
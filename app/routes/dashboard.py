@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.db.database import get_db
-from app.models import user as user_model, savings as savings_model, watchlist as watchlist_model
+from app.models import savings as savings_model, watchlist as watchlist_model
+from app.schemas.dashboard import Dashboard
 from app.services.auth import get_current_user
+from app.services.savings_summary import get_summary
 
 router = APIRouter()
 
-@router.get("/dashboard")
+@router.get("/dashboard", response_model=Dashboard)
 def get_dashboard(db: Session = Depends(get_db), user=Depends(get_current_user)):
     # User Info
     user_info = {
@@ -14,20 +16,25 @@ def get_dashboard(db: Session = Depends(get_db), user=Depends(get_current_user))
         "email": user.email,
     }
 
-    # total savings
-    goals = db.query(savings_model.SavingsGoal).filter_by(user_id=user.id).all()
-    total_saved = sum(goal.current_amount for goal in goals)
+    # total savings and goal counts (summary row, or aggregated in SQL)
+    summary = get_summary(db, user.id)
 
-    # active goals
-    active_goals = [goal for goal in goals if goal.current_amount < goal.target_amount]
+    # active goals, only the columns shown
+    goal = savings_model.SavingsGoal
+    active_goals = db.query(goal.id, goal.goal_name, goal.target_amount, goal.target_date, goal.current_amount).filter(
+        goal.user_id == user.id, goal.current_amount < goal.target_amount
+    ).all()
 
     # watchlist
-    watchlist = db.query(watchlist_model.WatchlistItem).filter_by(user_id=user.id).all()
-    watchlist_data = [{"symbol": item.symbol, "company_name": item.company_name} for item in watchlist]
+    item = watchlist_model.WatchlistItem
+    watchlist = db.query(item.symbol, item.company_name).filter(item.user_id == user.id).all()
 
     return {
         "user": user_info,
-        "total_savings": total_saved,
+        "total_savings": summary["total_saved"],
+        "active_goal_count": summary["active_goals"],
+        "goal_count": summary["goal_count"],
+        # rows go straight into the response model (from_attributes)
         "active_goals": active_goals,
-        "watchlist": watchlist_data,
+        "watchlist": watchlist,
     }
@@ -5,6 +5,9 @@ from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
 from app.models.user import User
 from app.services.openai_agent import get_financial_advice_from_chatbot
+from app.services.ratelimit import UpstreamBusy
+from app.routes.ai_chat import advice_stream_response
+from app.schemas.chat import ChatbotResponse
 
 router = APIRouter()
 
@@ -17,15 +20,22 @@ def get_db():
         db.close()
 
 
-@router.post("/chatbot")
-def talk_to_financial_bot(query: str):
+@router.post("/chatbot", response_model=ChatbotResponse)
+async def talk_to_financial_bot(query: str):
     try:
-        reply = get_financial_advice_from_chatbot(query)
+        reply = await get_financial_advice_from_chatbot(query)
         return {"response": reply}
+    except UpstreamBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error talking to AI bot: {str(e)}")
 
 
+@router.post("/chatbot/stream")
+async def stream_financial_bot(query: str):
+    return advice_stream_response(query)
+
+
 
 
 
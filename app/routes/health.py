@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.schemas.health import Health, Readiness, StartupReport
+from app.services.startup import startup_report
+
+router = APIRouter()
+
+
+# liveness: the process is up and serving
+@router.get("/health", response_model=Health)
+async def health():
+    return {"status": "ok"}
+
+
+# readiness: startup (schema, pool warm-up, clients) finished, safe to route traffic here
+@router.get("/health/ready", response_model=Readiness)
+async def ready():
+    if not startup_report.ready:
+        return JSONResponse(status_code=503, content={"ready": False})
+    return {"ready": True}
+
+
+@router.get("/health/startup", response_model=StartupReport)
+async def startup():
+    return startup_report.as_dict()
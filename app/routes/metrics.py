@@ -0,0 +1,22 @@
+from typing import Dict
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from app.schemas.chat import CacheStats
+from app.services.auth import Principal, get_admin_user
+from app.services.cache import cache_stats
+from app.services.metrics import render_metrics
+
+router = APIRouter()
+
+
+# async on purpose: the threadpool gauges must be read on the event loop
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# per namespace, for this worker (hit/miss counts aren't shared even when the entries are); admins only
+@router.get("/cache/stats", response_model=Dict[str, CacheStats])
+def get_cache_stats(admin: Principal = Depends(get_admin_user)):
+    return cache_stats()
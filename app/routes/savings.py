@@ -1,21 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
-from app.schemas.savings import SavingsGoalCreate
+from app.schemas.savings import (
+    SavingsGoalCreate, SavingsGoalCreated, SavingsProgress, SavingsProgressBatch, SavingsProgressUpdate,
+)
 from app.models import savings
-from app.db.database import get_db
-from app.services.auth import get_current_user
+from app.models.transaction import Transaction
+from app.db.database import SessionLocal, get_db
+from app.services.auth import Principal, get_admin_user, get_current_user_id
+from app.services.chat_memory import invalidate_user_context_on_commit
 from app.services.transaction_log import log_transaction
+from app.services.savings_summary import apply_summary_delta, is_active
 from typing import List
-from app.schemas.savings import SavingsGoalOut
+from app.schemas.savings import GoalProjection, SavingsGoalOut, SavingsGoalPage
+from app.services.pagination import MAX_PAGE_SIZE, decode_id_cursor, encode_cursor, stream_ndjson
+from app.services import projections
+from app.services.serialization import json_response
+from app.schemas.common import Message
 
 
 router = APIRouter(prefix="/savings", tags=["Savings"])
 
+Goal = savings.SavingsGoal
+GOAL_COLUMNS = (
+    Goal.id, Goal.goal_name, Goal.target_amount, Goal.target_date, Goal.current_amount,
+    Goal.investing, Goal.expected_return, Goal.interest_type, Goal.risk_tolerance,
+)
+
 
-@router.post("/create")
-def create_savings_goal(goal: SavingsGoalCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.post("/create", response_model=SavingsGoalCreated)
+def create_savings_goal(goal: SavingsGoalCreate, db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
     new_goal = savings.SavingsGoal(
-        user_id=user.id,
+        user_id=user_id,
         goal_name=goal.goal_name,
         target_amount=goal.target_amount,
         target_date=goal.target_date,
@@ -25,55 +45,186 @@ def create_savings_goal(goal: SavingsGoalCreate, db: Session = Depends(get_db),
         investing=goal.investing
     )
     db.add(new_goal)
+    apply_summary_delta(db, user_id, active_goals=int(is_active(0.0, goal.target_amount)), goal_count=1)
     db.commit()
     db.refresh(new_goal)
     return {"message": "Savings goal created", "goal": new_goal}
 
 
-# potentially add the create_transaction function down here
-@router.patch("/update/{goal_id}")
-def update_savings_progress(goal_id: int, amount: float, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    goal = db.query(savings.SavingsGoal).filter_by(id=goal_id, user_id=user.id).first()
-    if not goal:
-        raise HTTPException(status_code=404, detail="Goal not found")
-
-    goal.current_amount += amount
-    db.commit()
-    db.refresh(goal)
-
+def _increment_goal(db: Session, user_id: int, goal_id: int, amount: float):
+    """
+    Adds `amount` to the goal in a single UPDATE (no read-modify-write, so concurrent deposits
+    can't overwrite each other) and logs it in the same transaction. Returns the updated goal
+    as a dict, or None if the user has no such goal. The caller commits.
+    """
+    statement = update(Goal).where(Goal.id == goal_id, Goal.user_id == user_id).values(
+        current_amount=func.coalesce(Goal.current_amount, 0.0) + amount
+    ).execution_options(synchronize_session=False)
+
+    if db.get_bind().dialect.update_returning:
+        row = db.execute(statement.returning(*GOAL_COLUMNS)).first()
+    else:
+        # no UPDATE ... RETURNING on MySQL; the UPDATE holds the row lock until commit,
+        # so reading the row back in the same transaction sees exactly our result
+        if db.execute(statement).rowcount == 0:
+            return None
+        row = db.query(*GOAL_COLUMNS).filter(Goal.id == goal_id).first()
+    if row is None:
+        return None
+
+    # a Core UPDATE, the ORM hooks don't see it
+    invalidate_user_context_on_commit(db, user_id)
     log_transaction(
         db=db,
-        user_id=user.id,
+        user_id=user_id,
         transaction_type="progress_update",
         amount=amount,
         description="Updated progress for savings goal",
-        related_id=goal.id
+        related_id=goal_id
     )
+    return row._asdict()
+
+
+def _active_delta(goal: dict, amount: float) -> int:
+    was_active = is_active(goal["current_amount"] - amount, goal["target_amount"])
+    return int(is_active(goal["current_amount"], goal["target_amount"])) - int(was_active)
+
+
+# potentially add the create_transaction function down here
+@router.patch("/update/{goal_id}", response_model=SavingsProgress)
+def update_savings_progress(goal_id: int, amount: float, db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
+    goal = _increment_goal(db, user_id, goal_id, amount)
+    if goal is None:
+        raise HTTPException(status_code=404, detail="Goal not found")
+
+    apply_summary_delta(db, user_id, total_saved=amount, active_goals=_active_delta(goal, amount))
+    # goal, summary and log entry land in one commit
+    db.commit()
 
     return {"message": "Progress tracked.", "goal": goal}
 
 
+@router.patch("/update", response_model=SavingsProgressBatch)
+def update_savings_progress_batch(
+        updates: List[SavingsProgressUpdate],
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    if not updates:
+        raise HTTPException(status_code=400, detail="No updates given")
+
+    goals, missing = [], []
+    total_saved, active_goals = 0.0, 0
+    # fixed lock order across requests, so two batches touching the same goals can't deadlock
+    for item in sorted(updates, key=lambda u: u.goal_id):
+        goal = _increment_goal(db, user_id, item.goal_id, item.amount)
+        if goal is None:
+            missing.append(item.goal_id)
+            continue
+        goals.append(goal)
+        total_saved += item.amount
+        active_goals += _active_delta(goal, item.amount)
+
+    # all or nothing
+    if missing:
+        db.rollback()
+        raise HTTPException(status_code=404, detail={"message": "Goal not found", "goal_ids": missing})
+
+    apply_summary_delta(db, user_id, total_saved=total_saved, active_goals=active_goals)
+    db.commit()
+
+    return {"message": "Progress tracked.", "goals": goals}
+
+
 # potentially add the create_transaction function down here
-@router.delete("/delete/{goal_id}")
-def delete_savings_goal(goal_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    goal = db.query(savings.SavingsGoal).filter_by(id=goal_id, user_id=user.id).first()
+@router.delete("/delete/{goal_id}", response_model=Message)
+def delete_savings_goal(goal_id: int, db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
+    goal = db.query(savings.SavingsGoal).filter_by(id=goal_id, user_id=user_id).first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
 
+    # the goal's history outlives it, but can't keep pointing at it (transactions.savings_goal_id is a plain FK)
+    db.execute(
+        update(Transaction).where(Transaction.savings_goal_id == goal.id).values(savings_goal_id=None)
+        .execution_options(synchronize_session=False)
+    )
     db.delete(goal)
-    db.commit()
-
+    apply_summary_delta(
+        db, user_id,
+        total_saved=-(goal.current_amount or 0.0),
+        active_goals=-int(is_active(goal.current_amount, goal.target_amount)),
+        goal_count=-1,
+    )
     log_transaction(
         db=db,
-        user_id=user.id,
+        user_id=user_id,
         transaction_type="delete",
-        description="Deleted savings goal",
-        related_id=goal.id
+        description=f"Deleted savings goal {goal.id}",
     )
+    db.commit()
 
     return {"message": "Savings amount deleted"}
 
 
-@router.get("/savings/goals", response_model=List[SavingsGoalOut])
-def get_goals(db: Session = Depends(get_db)):
-    return db.query(savings.SavingsGoal).all()
+# only what SavingsGoalOut exposes
+GOAL_LIST_COLUMNS = (Goal.id, Goal.goal_name, Goal.target_amount, Goal.target_date, Goal.current_amount)
+
+
+@router.get("/savings/goals", response_model=SavingsGoalPage)
+def get_goals(
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        stream: bool = False,
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    after_id = decode_id_cursor(cursor)
+    statement = select(*GOAL_LIST_COLUMNS).where(Goal.user_id == user_id).order_by(Goal.id)
+    if after_id is not None:
+        statement = statement.where(Goal.id > after_id)
+    if stream:
+        return stream_ndjson(statement, lambda row: encode_cursor(row.id))
+
+    rows = db.execute(statement.limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return json_response(SavingsGoalPage, {"items": rows[:limit], "next_cursor": next_cursor})
+
+
+@router.get("/savings/projections", response_model=List[GoalProjection])
+def get_projections(
+        monthly_contribution: float = Query(0.0, ge=0),
+        simulations: int = Query(projections.DEFAULT_SIMULATIONS, ge=1, le=projections.MAX_SIMULATIONS),
+        seed: Optional[int] = None,
+        include_path: bool = True,
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    # sync on purpose: the simulation is CPU work and runs in the threadpool
+    rows = db.execute(
+        select(*projections.GOAL_COLUMNS).where(Goal.user_id == user_id).order_by(Goal.id)
+    ).all()
+    results = projections.project_goals(rows, monthly_contribution, simulations, seed=seed, include_path=include_path)
+    return json_response(List[GoalProjection], results)
+
+
+def _ndjson_projections(monthly_contribution: float, simulations: int, seed: Optional[int]):
+    # own session: the request's session is closed before a streaming body is sent
+    db = SessionLocal()
+    try:
+        for result in projections.project_all_goals(db, monthly_contribution, simulations, seed=seed):
+            yield orjson.dumps(result) + b"\n"
+    finally:
+        db.close()
+
+
+@router.get("/savings/projections/all")
+def get_all_projections(
+        monthly_contribution: float = Query(0.0, ge=0),
+        simulations: int = Query(projections.DEFAULT_SIMULATIONS, ge=1, le=projections.MAX_SIMULATIONS),
+        seed: Optional[int] = None,
+        admin: Principal = Depends(get_admin_user)
+):
+    # batch job over every user's goals (admins only): simulated a chunk at a time, streamed as NDJSON
+    return StreamingResponse(
+        _ndjson_projections(monthly_contribution, simulations, seed), media_type="application/x-ndjson"
+    )
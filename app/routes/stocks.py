@@ -1,8 +1,33 @@
-from fastapi import APIRouter
-from app.services.stocks import get_stock_price
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from app.services.stocks import get_stock_price, get_stock_prices, MAX_SYMBOLS_PER_REQUEST
+from app.services.price_store import get_history
+from app.schemas.stocks import PriceHistory, Quote, QuoteBatch
 
 router = APIRouter()
 
-@router.get("/stock/{symbol}")
+@router.get("/stock/{symbol}", response_model=Quote)
 async def get_stock(symbol: str):
     return await get_stock_price(symbol)
+
+@router.get("/stock/{symbol}/history", response_model=PriceHistory)
+async def get_stock_history(
+        symbol: str,
+        interval: str = "1day",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        refresh: bool = True,
+):
+    # served from the local store; refresh=false never touches the network
+    return await get_history(symbol, interval, start, end, refresh_stale=refresh)
+
+@router.get("/stocks/quotes", response_model=QuoteBatch)
+async def get_stock_quotes(symbols: str = Query(..., description="Comma separated symbols, e.g. 2222.SR,1120.SR")):
+    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    if len(symbol_list) > MAX_SYMBOLS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SYMBOLS_PER_REQUEST} symbols per request")
+    return await get_stock_prices(symbol_list)
@@ -1,21 +1,40 @@
-from fastapi import APIRouter, Depends
+import csv
+import io
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
 from sqlalchemy.orm import Session
-from app.schemas.transaction import TransactionCreate, TransactionOut
-from app.models import transaction
-from app.db.database import get_db
-from app.services.auth import get_current_user
+from app.schemas.transaction import (
+    TransactionCreate, TransactionImport, TransactionImportResult, TransactionOut, TransactionPage,
+)
+from app.models import transaction, savings
+from app.db.database import get_db, SessionLocal
+from app.services.auth import get_current_user_id
+from app.services.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from app.services.bulk_import import parse_rows, validate_rows, insert_in_chunks
+from app.services.serialization import json_response
 
 router = APIRouter(prefix="/transactions", tags=["Transactions"])
 
+EXPORT_BATCH_SIZE = 1000
+
+Tx = transaction.Transaction
+TX_COLUMNS = (Tx.id, Tx.type, Tx.amount, Tx.description, Tx.savings_goal_id, Tx.timestamp)
+
 
 @router.post("/", response_model=TransactionOut, name="create transaction")
 def create_transaction(
         data: TransactionCreate,
         db: Session = Depends(get_db),
-        user=Depends(get_current_user)
+        user_id: int = Depends(get_current_user_id)
 ):
     new_tx = transaction.Transaction(
-        user_id=user.id,
+        user_id=user_id,
         savings_goal_id=data.savings_goal_id,
         type=data.type,
         amount=data.amount,
@@ -27,10 +46,123 @@ def create_transaction(
     return new_tx
 
 
-@router.get("/", response_model=list[TransactionOut], name="get user transactions")
+def _import_transactions(db: Session, user_id: int, items: list) -> tuple[int, list[dict]]:
+    # a row may only point at one of the user's own goals
+    own_goals = {goal_id for (goal_id,) in db.query(savings.SavingsGoal.id).filter_by(user_id=user_id)}
+    now = datetime.utcnow()
+    rows, errors = [], []
+    for number, item in items:
+        if item.savings_goal_id is not None and item.savings_goal_id not in own_goals:
+            errors.append({"row": number, "errors": [{"loc": ["savings_goal_id"], "msg": "Goal not found"}]})
+            continue
+        values = item.model_dump()
+        values["timestamp"] = values["timestamp"] or now
+        rows.append((number, dict(values, user_id=user_id)))
+    inserted, insert_errors = insert_in_chunks(db, Tx, rows)
+    return inserted, errors + insert_errors
+
+
+@router.post("/bulk", response_model=TransactionImportResult, name="bulk import transactions")
+async def bulk_import_transactions(
+        request: Request,
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    """
+    Body: JSON array of transactions, or CSV (Content-Type: text/csv) with the same column names.
+    Invalid rows are reported by row number and skipped, the valid ones are inserted.
+    """
+    rows = parse_rows(await request.body(), request.headers.get("content-type", ""))
+    valid, errors = validate_rows(rows, TransactionImport)
+    inserted, insert_errors = await run_in_threadpool(_import_transactions, db, user_id, valid)
+    errors = sorted(errors + insert_errors, key=lambda e: e["row"])
+    return {"received": len(rows), "inserted": inserted, "errors": errors}
+
+
+def _history_filters(user_id: int, start: Optional[datetime], end: Optional[datetime], tx_type: Optional[str]) -> list:
+    filters = [Tx.user_id == user_id]
+    if start is not None:
+        filters.append(Tx.timestamp >= start)
+    if end is not None:
+        filters.append(Tx.timestamp < end)
+    if tx_type is not None:
+        filters.append(Tx.type == tx_type)
+    return filters
+
+
+@router.get("/", response_model=TransactionPage, name="get user transactions")
 def get_user_transactions(
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        tx_type: Optional[str] = Query(None, alias="type"),
         db: Session = Depends(get_db),
-        user=Depends(get_current_user)
+        user_id: int = Depends(get_current_user_id)
 ):
-    return db.query(transaction.Transaction).filter_by(user_id=user.id).order_by(
-        transaction.Transaction.timestamp.desc()).all()
+    filters = _history_filters(user_id, start, end, tx_type)
+    if cursor:
+        # keyset: continue strictly after the last (timestamp, id) of the previous page
+        try:
+            last_timestamp, last_id = decode_cursor(cursor)
+            last_timestamp = datetime.fromisoformat(last_timestamp)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        filters.append(or_(
+            Tx.timestamp < last_timestamp,
+            and_(Tx.timestamp == last_timestamp, Tx.id < last_id),
+        ))
+
+    rows = db.query(*TX_COLUMNS).filter(*filters).order_by(
+        Tx.timestamp.desc(), Tx.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return json_response(TransactionPage, {"items": rows, "next_cursor": next_cursor})
+
+
+def _export_rows(user_id: int, start: Optional[datetime], end: Optional[datetime], tx_type: Optional[str], fmt: str):
+    # own session: the request's session is closed before a streaming body is sent
+    db = SessionLocal()
+    try:
+        statement = select(*TX_COLUMNS).where(*_history_filters(user_id, start, end, tx_type)).order_by(
+            Tx.timestamp.desc(), Tx.id.desc()
+        ).execution_options(yield_per=EXPORT_BATCH_SIZE)  # server side cursor, rows arrive in batches
+
+        columns = [column.key for column in TX_COLUMNS]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(columns)
+
+        for partition in db.execute(statement).partitions():
+            for row in partition:
+                if fmt == "csv":
+                    writer.writerow(row)
+                else:
+                    buffer.write(orjson.dumps(row._asdict()).decode() + "\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+@router.get("/export", name="export user transactions")
+def export_user_transactions(
+        fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        tx_type: Optional[str] = Query(None, alias="type"),
+        user_id: int = Depends(get_current_user_id)
+):
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(user_id, start, end, tx_type, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions.{fmt}"'},
+    )
@@ -1,28 +1,51 @@
 # contains route handlers for user related stuff (create user, login, etc.).
 
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
 from app.models.user import User
-from app.schemas.user import UserResponse, UserCreate, UserLogin
-from app.services.auth import hash_password, verify_password, create_access_token
-from app.services.auth import get_current_user
+from app.schemas.user import UserResponse, UserCreate, UserLogin, UserPage, Token, SavingsUpdated, Profile
+from app.services.auth import hash_password, verify_and_update_password, create_access_token
+from app.services.auth import get_admin_user, get_current_user, Principal
 from app.db.database import get_db
 from app.schemas.user import UserLogin
+from app.services.pagination import MAX_PAGE_SIZE, decode_id_cursor, encode_cursor, stream_ndjson
+from app.services.serialization import json_response
 
 router = APIRouter(prefix="/user", tags=["user"])
 
 
-# Get all users
-@router.get("/users")
-def get_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    return users
+# only what UserResponse exposes, never the password hash
+USER_COLUMNS = (User.id, User.name, User.email, User.savings)
+
+
+# Get all users (admins only), a page at a time (or streamed as NDJSON with ?stream=true)
+@router.get("/users", response_model=UserPage)
+def get_users(
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        stream: bool = False,
+        db: Session = Depends(get_db),
+        admin: Principal = Depends(get_admin_user)
+):
+    after_id = decode_id_cursor(cursor)
+    statement = select(*USER_COLUMNS).order_by(User.id)
+    if after_id is not None:
+        statement = statement.where(User.id > after_id)
+    if stream:
+        return stream_ndjson(statement, lambda row: encode_cursor(row.id))
+
+    rows = db.execute(statement.limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return json_response(UserPage, {"items": rows[:limit], "next_cursor": next_cursor})
 
 
 # Create a new user
-@router.post("/signup")
+@router.post("/signup", response_model=Token)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
     existing = db.query(User).filter(User.email == user.email).first()
     if existing:
@@ -42,7 +65,7 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
 
 
 # Update savings
-@router.put("/{user_id}/savings")
+@router.put("/{user_id}/savings", response_model=SavingsUpdated)
 def update_savings(user_id: int, amount: int, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -52,18 +75,25 @@ def update_savings(user_id: int, amount: int, db: Session = Depends(get_db)):
     return {"message": "Savings updated", "current_savings": user.current_savings}
 
 
-@router.post("/login")
+@router.post("/login", response_model=Token)
 def login(form_data: UserLogin, db: Session = Depends(get_db)):
     db_user = db.query(User).filter(User.email == form_data.email).first()
-    if not db_user or not verify_password(form_data.password, db_user.password_hash):
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    valid, new_hash = verify_and_update_password(form_data.password, db_user.password_hash)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    # stored hash used old cost settings, upgrade it now that we know the password
+    if new_hash:
+        db_user.password_hash = new_hash
+        db.commit()
     token = create_access_token(user_id=db_user.id)
     return {"access_token": token, "token_type": "bearer"}
 
 
 
-@router.get("/profile")
-def read_profile(current_user: User = Depends(get_current_user)):
+@router.get("/profile", response_model=Profile)
+def read_profile(current_user: Principal = Depends(get_current_user)):
     return {
         "name": current_user.name,
         "email": current_user.email,
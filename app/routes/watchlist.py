@@ -1,11 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
 
 from app.db.database import get_db
 from app.models import watchlist as model
-from app.schemas.watchlist import WatchlistItem, WatchlistItemOut
-from app.services.auth import get_current_user
+from app.models.savings import SavingsGoal
+from app.schemas.common import Message
+from app.schemas.watchlist import WatchlistAnalytics, WatchlistImportResult, WatchlistItem, WatchlistItemOut
+from app.services.auth import get_current_user_id
+from app.services.quote_stream import quote_hub
+from app.services.sse import SSE_HEADERS, KEEP_ALIVE, sse_event
+from app.services.bulk_import import parse_rows, validate_rows, insert_in_chunks
+from app.services.analytics import TOLERANCE_MAX_SCORE, watchlist_analytics
+from app.services.serialization import json_response
 
 router = APIRouter()
 
@@ -13,10 +24,10 @@ router = APIRouter()
 def add_to_watchlist(
         item: WatchlistItem,
         db: Session = Depends(get_db),
-        user=Depends(get_current_user)
+        user_id: int = Depends(get_current_user_id)
 ):
     watchlist_item = model.WatchlistItem(
-        user_id=user.id,
+        user_id=user_id,
         symbol=item.symbol,
         company_name=item.company_name
     )
@@ -25,16 +36,93 @@ def add_to_watchlist(
     db.refresh(watchlist_item)
     return watchlist_item
 
+def _import_watchlist(db: Session, user_id: int, items: list) -> dict:
+    # symbols already on the watchlist, or repeated in the file, are skipped
+    seen = {symbol.upper() for (symbol,) in db.query(model.WatchlistItem.symbol).filter_by(user_id=user_id) if symbol}
+    rows, skipped = [], []
+    for number, item in items:
+        key = item.symbol.strip().upper()
+        if key in seen:
+            skipped.append({"row": number, "symbol": item.symbol})
+            continue
+        seen.add(key)
+        rows.append((number, {"user_id": user_id, "symbol": item.symbol.strip(), "company_name": item.company_name}))
+    inserted, errors = insert_in_chunks(db, model.WatchlistItem, rows)
+    return {"inserted": inserted, "skipped": skipped, "errors": errors}
+
+
+@router.post("/watchlist/bulk", response_model=WatchlistImportResult)
+async def bulk_add_to_watchlist(
+        request: Request,
+        db: Session = Depends(get_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    """
+    Body: JSON array of {symbol, company_name}, or CSV (Content-Type: text/csv) with those columns.
+    """
+    rows = parse_rows(await request.body(), request.headers.get("content-type", ""))
+    valid, errors = validate_rows(rows, WatchlistItem)
+    result = await run_in_threadpool(_import_watchlist, db, user_id, valid)
+    result["errors"] = sorted(errors + result["errors"], key=lambda e: e["row"])
+    return {"received": len(rows), **result}
+
+WATCHLIST_COLUMNS = (model.WatchlistItem.id, model.WatchlistItem.user_id, model.WatchlistItem.symbol, model.WatchlistItem.company_name)
+
+
 @router.get("/watchlist", response_model=List[WatchlistItemOut])
-def get_watchlist(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    items = db.query(model.WatchlistItem).filter_by(user_id=user.id).all()
-    return items
+def get_watchlist(db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
+    items = db.query(*WATCHLIST_COLUMNS).filter_by(user_id=user_id).all()
+    return json_response(List[WatchlistItemOut], items)
+
+def _analytics_inputs(db: Session, user_id: int) -> tuple:
+    symbols = [symbol for (symbol,) in db.query(model.WatchlistItem.symbol).filter_by(user_id=user_id) if symbol]
+    tolerances = [
+        t.strip().lower() for (t,) in db.query(SavingsGoal.risk_tolerance).filter_by(user_id=user_id, investing=True) if t
+    ]
+    # the most cautious tolerance across the user's investing goals
+    known = [t for t in tolerances if t in TOLERANCE_MAX_SCORE]
+    return symbols, min(known, key=TOLERANCE_MAX_SCORE.get) if known else None
 
-@router.delete("/watchlist/{symbol}")
-def delete_from_watchlist(symbol: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    item = db.query(model.WatchlistItem).filter_by(user_id=user.id, symbol=symbol).first()
+
+@router.get("/watchlist/analytics", response_model=WatchlistAnalytics)
+async def get_watchlist_analytics(db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
+    """
+    Returns, volatility, drawdown, correlation and risk score for the watchlist, from locally stored daily bars.
+    """
+    symbols, risk_tolerance = await run_in_threadpool(_analytics_inputs, db, user_id)
+    return await watchlist_analytics(symbols, risk_tolerance)
+
+@router.delete("/watchlist/{symbol}", response_model=Message)
+def delete_from_watchlist(symbol: str, db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
+    item = db.query(model.WatchlistItem).filter_by(user_id=user_id, symbol=symbol).first()
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     db.delete(item)
     db.commit()
     return {"message": "Removed from watchlist"}
+
+
+STREAM_KEEP_ALIVE_SECONDS = 20
+
+
+async def _quote_events(symbols: List[str]):
+    queue = quote_hub.subscribe(symbols)
+    try:
+        yield sse_event({"symbols": symbols}, event="subscribed")
+        while True:
+            try:
+                quote = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEP_ALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield KEEP_ALIVE
+                continue
+            yield sse_event(quote, event="quote")
+    finally:
+        # runs when the client disconnects
+        quote_hub.unsubscribe(queue, symbols)
+
+
+@router.get("/watchlist/stream")
+def stream_watchlist_prices(db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
+    rows = db.query(model.WatchlistItem.symbol).filter_by(user_id=user_id).all()
+    symbols = sorted({row.symbol.upper() for row in rows if row.symbol})
+    return StreamingResponse(_quote_events(symbols), media_type="text/event-stream", headers=SSE_HEADERS)
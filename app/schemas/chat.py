@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class ChatRequest(BaseModel):
+    message: str
+
+
+class ChatResponse(BaseModel):
+    reply: str
+
+
+class ChatbotResponse(BaseModel):
+    response: str
+
+
+class CacheStats(BaseModel):
+    namespace: str
+    backend: str
+    hits: int
+    misses: int
+    errors: int
+    hit_ratio: float
+    size: Optional[int] = None
+    maxsize: Optional[int] = None
+    ttl: float
+
+
+class ChatSessionCreate(BaseModel):
+    title: Optional[str] = Field(None, max_length=255)
+
+
+class ChatSessionOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class ChatSessionDetail(ChatSessionOut):
+    # what the model remembers of the turns that no longer fit the history budget
+    summary: Optional[str] = None
+
+
+class ChatMessageOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    role: str
+    content: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    created_at: datetime
+
+
+class ChatMessagePage(BaseModel):
+    items: List[ChatMessageOut]
+    next_cursor: Optional[str] = None
+
+
+class TokenUsage(BaseModel):
+    # as measured by the provider, None if it didn't report them
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+class ChatTurn(BaseModel):
+    session_id: int
+    message_id: int
+    reply: str
+    usage: TokenUsage
@@ -0,0 +1,35 @@
+from datetime import date
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class DashboardUser(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+
+
+class DashboardGoal(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    goal_name: str
+    target_amount: float
+    target_date: date
+    current_amount: Optional[float] = None
+
+
+class DashboardWatchlistItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    symbol: Optional[str] = None
+    company_name: Optional[str] = None
+
+
+class Dashboard(BaseModel):
+    user: DashboardUser
+    total_savings: float
+    active_goal_count: int
+    goal_count: int
+    active_goals: List[DashboardGoal]
+    watchlist: List[DashboardWatchlistItem]
@@ -0,0 +1,25 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class Health(BaseModel):
+    status: str
+
+
+class Readiness(BaseModel):
+    ready: bool
+
+
+class StartupPhase(BaseModel):
+    phase: str
+    seconds: Optional[float] = None
+    ok: bool
+    required: Optional[bool] = None
+    error: Optional[str] = None
+
+
+class StartupReport(BaseModel):
+    ready: bool
+    total_seconds: Optional[float] = None
+    phases: List[StartupPhase]
@@ -1,5 +1,5 @@
-from typing import Optional
-from pydantic import BaseModel
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict
 from datetime import date
 
 
@@ -14,19 +14,55 @@ class SavingsGoalCreate(BaseModel):
 
 
 class SavingsGoalRead(SavingsGoalCreate):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     current_amount: float
 
-    class Config:
-        orm_mode = True
-
 
 class SavingsGoalOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     goal_name: str
     target_amount: float
     target_date: date
     current_amount: float
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+
+class SavingsGoalPage(BaseModel):
+    items: List[SavingsGoalOut]
+    next_cursor: Optional[str] = None
+
+
+class SavingsProgressUpdate(BaseModel):
+    goal_id: int
+    amount: float
+
+
+class SavingsGoalCreated(BaseModel):
+    message: str
+    goal: SavingsGoalRead
+
+
+class SavingsProgress(BaseModel):
+    message: str
+    goal: SavingsGoalRead
+
+
+class SavingsProgressBatch(BaseModel):
+    message: str
+    goals: List[SavingsGoalRead]
+
+
+class GoalProjection(BaseModel):
+    goal_id: int
+    goal_name: str
+    months_remaining: int
+    target_amount: float
+    current_amount: float
+    expected_final_amount: float
+    required_monthly_contribution: Optional[float] = None
+    probability_of_reaching_target: float
+    final_amount_percentiles: Dict[str, float]
+    path: Optional[List[float]] = None
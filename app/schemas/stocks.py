@@ -0,0 +1,31 @@
+from typing import Dict, List, Optional, Union
+
+from pydantic import BaseModel
+
+
+class Quote(BaseModel):
+    symbol: Optional[str] = None
+    name: Optional[str] = None
+    price: Union[str, float, None] = None
+    change: Union[str, float, None] = None
+
+
+class QuoteBatch(BaseModel):
+    quotes: Dict[str, Quote]
+    errors: Dict[str, str]
+
+
+class PriceBars(BaseModel):
+    # columnar, one entry per bar
+    time: List[int]
+    open: List[Optional[float]]
+    high: List[Optional[float]]
+    low: List[Optional[float]]
+    close: List[Optional[float]]
+    volume: List[Optional[float]]
+
+
+class PriceHistory(BaseModel):
+    symbol: str
+    interval: str
+    bars: PriceBars
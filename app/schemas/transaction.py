@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 class TransactionCreate(BaseModel):
@@ -8,9 +8,24 @@ class TransactionCreate(BaseModel):
     description: Optional[str]
     savings_goal_id: Optional[int]
 
+class TransactionImport(TransactionCreate):
+    # bank exports carry their own dates, new transactions default to now
+    timestamp: Optional[datetime] = None
+
 class TransactionOut(TransactionCreate):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     timestamp: datetime
 
-    class Config:
-        orm_mode = True
+
+class TransactionPage(BaseModel):
+    items: List[TransactionOut]
+    next_cursor: Optional[str] = None
+
+
+class TransactionImportResult(BaseModel):
+    received: int
+    inserted: int
+    # {"row": n, "errors": [...]} per rejected row
+    errors: List[Dict[str, Any]]
@@ -1,7 +1,7 @@
 from datetime import date
 
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 
 
 class UserCreate(BaseModel):
@@ -18,9 +18,28 @@ class UserResponse(BaseModel):
     savings: float
 
 
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
-    class Config:
-        orm_mode = True
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+
+
+class SavingsUpdated(BaseModel):
+    message: str
+    current_savings: Optional[float] = None
+
+
+class Profile(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    savings: Optional[float] = None
+    goal: Optional[float] = None
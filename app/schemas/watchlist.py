@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict
 
 class WatchlistItem(BaseModel):
     symbol: str
@@ -8,8 +10,45 @@ class WatchlistItemCreate(WatchlistItem):
     pass
 
 class WatchlistItemOut(WatchlistItem):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     user_id: int
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+
+class WatchlistImportResult(BaseModel):
+    received: int
+    inserted: int
+    skipped: List[Dict[str, Any]]
+    errors: List[Dict[str, Any]]
+
+
+class SymbolAnalytics(BaseModel):
+    symbol: str
+    last_close: Optional[float] = None
+    returns: Dict[str, Optional[float]]
+    volatility: Optional[float] = None
+    max_drawdown: Optional[float] = None
+    risk_score: float
+
+
+class CorrelationMatrix(BaseModel):
+    symbols: List[str]
+    matrix: List[List[Optional[float]]]
+
+
+class PortfolioAnalytics(BaseModel):
+    volatility: Optional[float] = None
+    max_drawdown: Optional[float] = None
+    risk_score: float
+    risk_level: str
+    risk_tolerance: Optional[str] = None
+    exceeds_tolerance: Optional[bool] = None
+
+
+class WatchlistAnalytics(BaseModel):
+    as_of: Optional[int] = None
+    symbols: List[SymbolAnalytics]
+    correlation: CorrelationMatrix
+    portfolio: Optional[PortfolioAnalytics] = None
+    errors: Dict[str, str]
@@ -0,0 +1,163 @@
+# watchlist analytics from the local price store: trailing returns, volatility, drawdown,
+# correlation and a risk score, computed on one (symbols x days) matrix of aligned closes.
+
+import asyncio
+import os
+import warnings
+from typing import Optional
+
+import numpy as np
+
+from app.services import price_store
+
+TRADING_DAYS = 252
+RETURN_WINDOWS = {"1w": 5, "1m": 21, "3m": 63, "1y": 252}
+# daily bars loaded per symbol (a year of returns plus the longest window)
+ANALYTICS_LOOKBACK = int(os.getenv("ANALYTICS_LOOKBACK_DAYS", str(TRADING_DAYS + 1)))
+
+# highest risk score each tolerance is comfortable with (values used by savings goals)
+TOLERANCE_MAX_SCORE = {
+    "low": 35,
+    "considerate": 35,
+    "conservative": 35,
+    "medium": 60,
+    "moderate": 60,
+    "high": 85,
+}
+
+
+def align_closes(series: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Puts every symbol's closes on the union of their timestamps, shape (symbols, times).
+    Gaps (holidays on one exchange, late listings) are forward filled; values before a
+    symbol's first bar stay NaN.
+    """
+    times = np.unique(np.concatenate([bars["time"] for bars in series])) if series else np.empty(0, np.int64)
+    closes = np.full((len(series), times.size), np.nan)
+    for row, bars in enumerate(series):
+        closes[row, np.searchsorted(times, bars["time"])] = bars["close"]
+
+    present = ~np.isnan(closes)
+    last_seen = np.maximum.accumulate(np.where(present, np.arange(times.size), 0), axis=1)
+    filled = np.take_along_axis(closes, last_seen, axis=1)
+    started = np.logical_or.accumulate(present, axis=1)
+    return times, np.where(started, filled, np.nan)
+
+
+def trailing_returns(closes: np.ndarray) -> dict:
+    last = closes[:, -1]
+    returns = {}
+    for name, window in RETURN_WINDOWS.items():
+        if closes.shape[1] > window:
+            returns[name] = last / closes[:, -1 - window] - 1
+        else:
+            returns[name] = np.full(closes.shape[0], np.nan)
+    return returns
+
+
+def max_drawdowns(closes: np.ndarray) -> np.ndarray:
+    peaks = np.fmax.accumulate(closes, axis=1)
+    with np.errstate(invalid="ignore"):
+        drawdowns = closes / peaks - 1
+    return np.where(np.isnan(drawdowns), 0.0, drawdowns).min(axis=1, initial=0.0)
+
+
+def risk_scores(volatility: np.ndarray, drawdown: np.ndarray) -> np.ndarray:
+    # 0-100: 40% annual volatility or a 50% drawdown each use up their share of the scale
+    score = 60 * np.clip(volatility / 0.40, 0, 1) + 40 * np.clip(-drawdown / 0.50, 0, 1)
+    return np.round(score, 1)
+
+
+def _risk_level(score: float) -> str:
+    if score <= TOLERANCE_MAX_SCORE["low"]:
+        return "low"
+    if score <= TOLERANCE_MAX_SCORE["medium"]:
+        return "medium"
+    return "high"
+
+
+def _clean(values: np.ndarray, digits: int = 4) -> list:
+    rounded = np.round(values, digits).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded.tolist()
+
+
+def compute_analytics(symbols: list[str], series: list[np.ndarray], risk_tolerance: Optional[str] = None) -> dict:
+    tolerance = (risk_tolerance or "").strip().lower() or None
+    if not symbols:
+        return {"as_of": None, "symbols": [], "correlation": {"symbols": [], "matrix": []}, "portfolio": None}
+
+    times, closes = align_closes(series)
+    closes = closes[:, -ANALYTICS_LOOKBACK:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_returns = np.diff(np.log(closes), axis=1)
+
+    with warnings.catch_warnings():
+        # symbols with fewer than two returns just get NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        volatility = np.nanstd(log_returns, axis=1, ddof=1) * np.sqrt(TRADING_DAYS)
+    drawdown = max_drawdowns(closes)
+    scores = risk_scores(np.nan_to_num(volatility), drawdown)
+
+    # correlation and the equal weight portfolio only use days every symbol traded
+    complete = log_returns[:, ~np.isnan(log_returns).any(axis=0)]
+    if complete.shape[1] > 1:
+        correlation = np.corrcoef(complete) if len(symbols) > 1 else np.ones((1, 1))
+        weights = np.full(len(symbols), 1 / len(symbols))
+        covariance = np.atleast_2d(np.cov(complete))
+        portfolio_volatility = float(np.sqrt(weights @ covariance @ weights * TRADING_DAYS))
+        portfolio_closes = np.exp(np.cumsum(complete.mean(axis=0)))[None, :]
+        portfolio_drawdown = float(max_drawdowns(np.concatenate([[[1.0]], portfolio_closes], axis=1))[0])
+    else:
+        correlation = np.full((len(symbols), len(symbols)), np.nan)
+        portfolio_volatility = portfolio_drawdown = float("nan")
+
+    portfolio_score = float(risk_scores(np.nan_to_num(np.array([portfolio_volatility])),
+                                        np.nan_to_num(np.array([portfolio_drawdown])))[0])
+    returns = trailing_returns(closes)
+
+    return {
+        "as_of": int(times[-1]) if times.size else None,
+        "symbols": [
+            {
+                "symbol": symbol,
+                "last_close": _clean(closes[i:i + 1, -1])[0] if closes.shape[1] else None,
+                "returns": {name: _clean(values[i:i + 1])[0] for name, values in returns.items()},
+                "volatility": _clean(volatility[i:i + 1])[0],
+                "max_drawdown": _clean(drawdown[i:i + 1])[0],
+                "risk_score": float(scores[i]),
+            }
+            for i, symbol in enumerate(symbols)
+        ],
+        "correlation": {"symbols": symbols, "matrix": [_clean(row) for row in correlation]},
+        "portfolio": {
+            "volatility": _clean(np.array([portfolio_volatility]))[0],
+            "max_drawdown": _clean(np.array([portfolio_drawdown]))[0],
+            "risk_score": portfolio_score,
+            "risk_level": _risk_level(portfolio_score),
+            "risk_tolerance": tolerance,
+            "exceeds_tolerance": (portfolio_score > TOLERANCE_MAX_SCORE[tolerance])
+            if tolerance in TOLERANCE_MAX_SCORE else None,
+        },
+    }
+
+
+async def watchlist_analytics(symbols: list[str], risk_tolerance: Optional[str] = None) -> dict:
+    # history comes from the local store; refreshes for all symbols run concurrently
+    keys = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+    loaded = await asyncio.gather(*(price_store.refresh(key, "1day") for key in keys), return_exceptions=True)
+
+    ok_symbols, series, errors = [], [], {}
+    for key, bars in zip(keys, loaded):
+        if isinstance(bars, BaseException):
+            errors[key] = getattr(bars, "detail", None) or str(bars) or type(bars).__name__
+        elif bars.size == 0:
+            errors[key] = "No price history"
+        else:
+            ok_symbols.append(key)
+            # only the tail is needed, the rest of the memory map is never read
+            series.append(np.asarray(bars[-ANALYTICS_LOOKBACK:]))
+
+    result = compute_analytics(ok_symbols, series, risk_tolerance)
+    result["errors"] = errors
+    return result
@@ -2,26 +2,18 @@
 from __future__ import annotations
 
 import os
+from dataclasses import asdict, dataclass
 from typing import Optional, Type
-from passlib.context import CryptContext
-import jwt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from app.db.database import get_db
 from app.models.user import User
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+from app.services.cache import Cache
+# hashing lives in its own module so it can run in a separate process pool
+from app.services.passwords import hash_password, verify_password, verify_and_update_password
 
 
 SECRET_KEY = os.getenv("SECRET1", "fallback-dev-secret")            # change to a secret key
@@ -30,6 +22,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Token validity duration (changeable)
 
 
 def create_access_token(user_id: int, expires_delta: Optional[timedelta] = None) -> str:
+    from jose import jwt
+
     expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode = {
         "sub": str(user_id),  # canonical place for the user identifier
@@ -41,23 +35,120 @@ def create_access_token(user_id: int, expires_delta: Optional[timedelta] = None)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/user/login")
 
+# authenticated users are cached briefly so most requests skip the users table
+PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "10000"))
+# trust the signed token alone for routes that only need the user id (no lookup at all)
+AUTH_CLAIMS_ONLY = os.getenv("AUTH_CLAIMS_ONLY", "false").lower() in ("1", "true", "yes")
+# users allowed on admin routes (e.g. listing all users), comma separated ids
+ADMIN_USER_IDS = {int(i) for i in os.getenv("ADMIN_USER_IDS", "").split(",") if i.strip()}
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Read-only snapshot of the authenticated user (never includes the password hash).
+    """
+    id: int
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone_number: Optional[str] = None
+    savings: Optional[float] = None
+    savings_goal: Optional[float] = None
+    current_savings: Optional[float] = None
+    birthday: Optional[date] = None
+
+
+_PRINCIPAL_COLUMNS = (
+    User.id, User.name, User.email, User.phone_number,
+    User.savings, User.savings_goal, User.current_savings, User.birthday,
+)
+
+def _principal_from_dict(data: dict) -> Principal:
+    # shared cache backends hand back JSON, dates come back as ISO strings
+    if data.get("birthday"):
+        data["birthday"] = date.fromisoformat(data["birthday"])
+    return Principal(**data)
+
+
+_principal_cache = Cache(
+    "principals", ttl=PRINCIPAL_CACHE_TTL, maxsize=PRINCIPAL_CACHE_SIZE, encode=asdict, decode=_principal_from_dict
+)
+
+
+def invalidate_principal(user_id: int) -> None:
+    _principal_cache.delete(user_id)
+
+
+_CHANGED_USERS = "auth_changed_users"
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
+
+# any change to a user row drops its cached principal, once committed: dropping it at flush
+# time lets a concurrent request cache the old row again before the commit
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_changed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if target.id is not None and session is not None:
+        session.info.setdefault(_CHANGED_USERS, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session) -> None:
+    for user_id in session.info.pop(_CHANGED_USERS, ()):
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_uncommitted(session, transaction) -> None:
+    # rolled back: the cached principals are still current
+    if transaction.parent is None:
+        session.info.pop(_CHANGED_USERS, None)
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode_user_id(token: str) -> int:
+    # imported on first use, keeps python-jose out of worker start-up
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id_str: Optional[str] = payload.get("sub")
         if user_id_str is None:
-            raise credentials_exception
-        user_id = int(user_id_str)
+            raise _credentials_exception()
+        return int(user_id_str)
     except (JWTError, ValueError):
-        raise credentials_exception
+        raise _credentials_exception()
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    user_id = _decode_user_id(token)
+
+    principal = _principal_cache.get(user_id)
+    if principal is None:
+        row = db.query(*_PRINCIPAL_COLUMNS).filter(User.id == user_id).first()
+        if row is None:
+            raise _credentials_exception()
+        principal = Principal(**row._asdict())
+        _principal_cache.set(user_id, principal)
+    return principal
+
+
+def get_current_user_id(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> int:
+    # for routes that only scope queries by user id
+    if AUTH_CLAIMS_ONLY:
+        return _decode_user_id(token)
+    return get_current_user(token, db).id
+
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
+def get_admin_user(user: Principal = Depends(get_current_user)) -> Principal:
+    if user.id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
     return user
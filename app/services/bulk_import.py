@@ -0,0 +1,70 @@
+# shared pieces of the bulk import endpoints: parse a JSON/CSV body, validate rows, insert in chunks.
+
+import csv
+import io
+import json
+import logging
+import os
+from typing import Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+MAX_IMPORT_ROWS = int(os.getenv("MAX_IMPORT_ROWS", "50000"))
+
+
+def parse_rows(body: bytes, content_type: str) -> list[dict]:
+    """
+    Accepts a JSON array of objects, or CSV with a header row when the content type says so.
+    Empty CSV cells become None.
+    """
+    try:
+        text = body.decode("utf-8-sig")
+        if "csv" in content_type:
+            rows = [{key: (value if value != "" else None) for key, value in row.items()}
+                    for row in csv.DictReader(io.StringIO(text))]
+        else:
+            rows = json.loads(text)
+    except (UnicodeDecodeError, ValueError, csv.Error):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV with a header row")
+
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV with a header row")
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_IMPORT_ROWS} rows per import")
+    return rows
+
+
+def validate_rows(rows: list, schema: Type[BaseModel]) -> tuple[list[tuple[int, BaseModel]], list[dict]]:
+    # rows are numbered from 1, as a user would count them in their file
+    valid, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        try:
+            valid.append((number, schema.model_validate(row)))
+        except ValidationError as e:
+            errors.append({"row": number, "errors": e.errors(include_url=False, include_context=False, include_input=False)})
+    return valid, errors
+
+
+def insert_in_chunks(db: Session, model, rows: list[tuple[int, dict]]) -> tuple[int, list[dict]]:
+    """
+    Bulk inserts (executemany) `rows` in chunks of IMPORT_CHUNK_SIZE, one commit per chunk.
+    A chunk that fails is rolled back and its rows are reported as errors; the rest still go in.
+    """
+    inserted, errors = 0, []
+    for i in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        chunk = rows[i:i + IMPORT_CHUNK_SIZE]
+        try:
+            db.execute(insert(model), [values for _, values in chunk])
+            db.commit()
+            inserted += len(chunk)
+        except Exception:
+            db.rollback()
+            logger.exception("Bulk insert of %d %s rows failed", len(chunk), model.__tablename__)
+            errors.extend({"row": number, "errors": [{"msg": "Could not be saved"}]} for number, _ in chunk)
+    return inserted, errors
@@ -0,0 +1,452 @@
+# caches shared by the services (quotes, principals, chat answers).
+#
+# `Cache` is a namespace with its own TTL and hit/miss stats, stored in the backend picked
+# by CACHE_BACKEND:
+#   memory  in-process LRU (default), nothing is serialized
+#   sqlite  one SQLite file shared by every worker on the host (CACHE_SQLITE_PATH)
+#   redis   any Redis-protocol server (CACHE_REDIS_URL), shared across hosts
+# shared backends store values as JSON. A failing backend counts as a miss, it never fails the request.
+# Code on the event loop uses the a* methods (aget/aset/...), which run shared backends' blocking
+# I/O in a thread; the plain methods are for sync routes, which already run in the threadpool.
+
+import asyncio
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+from urllib.parse import unquote, urlparse
+
+import orjson
+
+from app.services.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join("data", "cache.sqlite3"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://127.0.0.1:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "rzk")
+# after a backend error, skip it (misses only) for this long instead of timing out on every lookup
+CACHE_RETRY_AFTER = float(os.getenv("CACHE_RETRY_AFTER", "5"))
+
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by namespace and result (hit/miss/error).", ("namespace", "result"))
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after `ttl` seconds.
+    Safe to share between the event loop and threadpool (sync) routes.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            # evict least recently used entries once over the limit
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class MemoryBackend:
+    """
+    In-process LRU, one per namespace. Values are kept as the objects themselves.
+    """
+    name = "memory"
+    shared = False
+
+    def __init__(self, maxsize: int):
+        self._cache = TTLCache(maxsize=maxsize)
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._cache.set(key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+    def clear(self, prefix: str) -> None:
+        self._cache.clear()
+
+    def size(self, prefix: str) -> Optional[int]:
+        return len(self._cache)
+
+
+class SQLiteBackend:
+    """
+    One table in a local SQLite file (WAL mode), so every worker on the host sees the
+    same entries. Entries are bounded by TTL only; expired rows are purged as writes go by.
+    """
+    name = "sqlite"
+    shared = True
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+                " WITHOUT ROWID"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self, prefix: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def size(self, prefix: str) -> Optional[int]:
+        return self._conn().execute(
+            "SELECT count(*) FROM cache WHERE substr(key, 1, ?) = ? AND expires_at > ?", (len(prefix), prefix, time.time())
+        ).fetchone()[0]
+
+
+class RedisError(Exception):
+    pass
+
+
+class _RespConnection:
+    # just enough RESP2 for GET/SET/DEL/SCAN
+    def __init__(self, host: str, port: int, timeout: float):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b"".join(parts))
+        return self._read()
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("connection closed by the cache server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RedisError(rest.decode(errors="replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RedisError(f"unexpected reply {line!r}")
+
+    def close(self) -> None:
+        try:
+            self._file.close()
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend:
+    """
+    Minimal Redis-protocol client with a small connection pool (works against Redis,
+    Valkey, KeyDB or the stand-in in benchmarks/fake_redis.py).
+    """
+    name = "redis"
+    shared = True
+    MAX_IDLE = 16
+
+    def __init__(self, url: str, timeout: float = 1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[_RespConnection]" = queue.LifoQueue()
+
+    def _connect(self) -> _RespConnection:
+        conn = _RespConnection(self.host, self.port, self.timeout)
+        if self.password:
+            conn.command("AUTH", self.password)
+        if self.db:
+            conn.command("SELECT", self.db)
+        return conn
+
+    def _command(self, *args):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            result = conn.command(*args)
+        except RedisError:
+            self._release(conn)
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        self._release(conn)
+        return result
+
+    def _release(self, conn: _RespConnection) -> None:
+        if self._idle.qsize() < self.MAX_IDLE:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._command("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    def delete(self, key: str) -> None:
+        self._command("DEL", key)
+
+    def _scan(self, prefix: str):
+        cursor = b"0"
+        while True:
+            cursor, keys = self._command("SCAN", cursor, "MATCH", prefix + "*", "COUNT", 500)
+            yield keys
+            if cursor in (b"0", 0):
+                return
+
+    def clear(self, prefix: str) -> None:
+        for keys in self._scan(prefix):
+            if keys:
+                self._command("DEL", *keys)
+
+    def size(self, prefix: str) -> Optional[int]:
+        # counting keys means a SCAN over the keyspace, not worth it for a stats call
+        return None
+
+
+_shared_backend = None
+_shared_lock = threading.Lock()
+
+
+def _get_shared_backend():
+    global _shared_backend
+    with _shared_lock:
+        if _shared_backend is None:
+            if CACHE_BACKEND == "sqlite":
+                _shared_backend = SQLiteBackend(CACHE_SQLITE_PATH)
+            elif CACHE_BACKEND == "redis":
+                _shared_backend = RedisBackend(CACHE_REDIS_URL)
+            else:
+                raise ValueError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}, expected memory, sqlite or redis")
+        return _shared_backend
+
+
+_namespaces: dict[str, "Cache"] = {}
+
+
+class Cache:
+    """
+    A cache namespace: keys are stored as "<CACHE_KEY_PREFIX>:<namespace>:<key>" with the
+    namespace's TTL. `encode`/`decode` turn values into JSON-able data and back for shared
+    backends (e.g. dataclasses); plain dicts/lists/strings need neither.
+    """
+
+    def __init__(self, namespace: str, ttl: float, maxsize: int = 1024,
+                 encode: Optional[Callable[[Any], Any]] = None, decode: Optional[Callable[[Any], Any]] = None,
+                 backend=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.prefix = f"{CACHE_KEY_PREFIX}:{namespace}:"
+        self.backend = backend or (MemoryBackend(maxsize) if CACHE_BACKEND == "memory" else _get_shared_backend())
+        self._encode = encode
+        self._decode = decode
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._down_until = 0.0
+        _namespaces[namespace] = self
+
+    def _call(self, method: str, *args):
+        if self._down_until > time.monotonic():
+            return None
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            self.errors += 1
+            self._down_until = time.monotonic() + CACHE_RETRY_AFTER
+            logger.warning("Cache %s (%s) %s failed, skipping it for %ss: %s",
+                           self.namespace, self.backend.name, method, CACHE_RETRY_AFTER, e)
+            return None
+
+    async def _acall(self, method: str, *args):
+        # shared backends do blocking socket/file I/O: off the event loop. memory is just a dict lookup
+        if not self.backend.shared:
+            return self._call(method, *args)
+        return await asyncio.to_thread(self._call, method, *args)
+
+    def _lookup(self, raw) -> Optional[Any]:
+        if raw is None:
+            self.misses += 1
+            CACHE_LOOKUPS.inc(namespace=self.namespace, result="miss")
+            return None
+        self.hits += 1
+        CACHE_LOOKUPS.inc(namespace=self.namespace, result="hit")
+        if not self.backend.shared:
+            return raw
+        value = orjson.loads(raw)
+        return self._decode(value) if self._decode else value
+
+    def _dump(self, value: Any) -> Any:
+        if self.backend.shared:
+            return orjson.dumps(self._encode(value) if self._encode else value)
+        return value
+
+    def _get_many(self, keys: list) -> list:
+        return [self._call("get", self.prefix + str(key)) for key in keys]
+
+    def _set_many(self, items: dict, ttl: float) -> None:
+        for key, value in items.items():
+            self._call("set", self.prefix + str(key), value, ttl)
+
+    # sync API, for sync routes/dependencies (they run in the threadpool)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        return self._lookup(self._call("get", self.prefix + str(key)))
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._call("set", self.prefix + str(key), self._dump(value), self.ttl if ttl is None else ttl)
+
+    def delete(self, key: Hashable) -> None:
+        self._call("delete", self.prefix + str(key))
+
+    def clear(self) -> None:
+        self._call("clear", self.prefix)
+
+    # async API, for anything running on the event loop
+
+    async def aget(self, key: Hashable) -> Optional[Any]:
+        return self._lookup(await self._acall("get", self.prefix + str(key)))
+
+    async def aget_many(self, keys: list) -> dict:
+        # one trip off the loop for the whole batch; misses are left out
+        if self.backend.shared:
+            raws = await asyncio.to_thread(self._get_many, keys)
+        else:
+            raws = self._get_many(keys)
+        values = {key: self._lookup(raw) for key, raw in zip(keys, raws)}
+        return {key: value for key, value in values.items() if value is not None}
+
+    async def aset(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        await self._acall("set", self.prefix + str(key), self._dump(value), self.ttl if ttl is None else ttl)
+
+    async def aset_many(self, items: dict, ttl: Optional[float] = None) -> None:
+        items = {key: self._dump(value) for key, value in items.items()}
+        ttl = self.ttl if ttl is None else ttl
+        if self.backend.shared:
+            await asyncio.to_thread(self._set_many, items, ttl)
+        else:
+            self._set_many(items, ttl)
+
+    async def adelete(self, key: Hashable) -> None:
+        await self._acall("delete", self.prefix + str(key))
+
+    async def aclear(self) -> None:
+        await self._acall("clear", self.prefix)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "size": self._call("size", self.prefix),
+            "maxsize": self.maxsize if not self.backend.shared else None,
+            "ttl": self.ttl,
+        }
+
+
+def cache_stats() -> dict:
+    # hit/miss counts are per worker, the entries themselves may be shared
+    return {name: cache.stats() for name, cache in _namespaces.items()}
@@ -0,0 +1,314 @@
+# conversational memory for the advisor chat: persisted sessions, the recent turns that fit
+# CHAT_HISTORY_TOKEN_BUDGET, a rolling summary of everything older, and a compact (cached)
+# description of the user's own goals and watchlist, so the prompt stays bounded as sessions grow.
+
+import asyncio
+import logging
+import math
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.db.database import SessionLocal
+from app.models.chat import ChatMessage, ChatSession
+from app.models.savings import SavingsGoal
+from app.models.watchlist import WatchlistItem
+from app.services import openai_agent
+from app.services.cache import Cache
+
+logger = logging.getLogger(__name__)
+
+# tokens of summary + past turns per prompt; the system prompt, user context and new message come on top
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+# turns pushed out of the budget are summarized once they add up to this much (one call per batch, not per turn)
+CHAT_SUMMARY_BATCH_TOKENS = int(os.getenv("CHAT_SUMMARY_BATCH_TOKENS", "400"))
+# most a single summary call is given to read
+CHAT_SUMMARY_INPUT_TOKENS = int(os.getenv("CHAT_SUMMARY_INPUT_TOKENS", "3000"))
+# newest messages looked at when building a prompt
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "100"))
+CHAT_MESSAGE_MAX_CHARS = int(os.getenv("CHAT_MESSAGE_MAX_CHARS", "4000"))
+
+# goals/watchlist as sent to the model, rebuilt when they change or after the TTL
+CHAT_CONTEXT_TTL = float(os.getenv("CHAT_CONTEXT_TTL", "600"))
+CHAT_CONTEXT_CACHE_SIZE = int(os.getenv("CHAT_CONTEXT_CACHE_SIZE", "10000"))
+CONTEXT_MAX_GOALS = 10
+CONTEXT_MAX_SYMBOLS = 25
+
+# framing tokens the API adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+TITLE_LENGTH = 60
+
+_context_cache = Cache("chat_context", ttl=CHAT_CONTEXT_TTL, maxsize=CHAT_CONTEXT_CACHE_SIZE)
+# sessions with a summary being written, so a burst of turns doesn't start several
+_summarizing: set[int] = set()
+# keeps summary tasks referenced until they finish
+_tasks: set[asyncio.Task] = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Budget estimate without a tokenizer: about 4 bytes of UTF-8 per token, which errs on the
+    large side for Arabic. Measured counts come back from the provider with every reply.
+    """
+    return math.ceil(len(text.encode("utf-8")) / 4) + MESSAGE_OVERHEAD_TOKENS
+
+
+_CHANGED_CONTEXTS = "chat_changed_contexts"
+
+
+def invalidate_user_context(user_id: int) -> None:
+    _context_cache.delete(user_id)
+
+
+def invalidate_user_context_on_commit(db: Session, user_id: int) -> None:
+    # for changes the mapper hooks below don't see, e.g. Core UPDATEs of goals
+    db.info.setdefault(_CHANGED_CONTEXTS, set()).add(user_id)
+
+
+# editing a goal or the watchlist drops the cached context once committed: dropping it at flush
+# time lets a concurrent chat request cache the old goals again (bulk imports bypass these, the TTL covers them)
+@event.listens_for(SavingsGoal, "after_insert")
+@event.listens_for(SavingsGoal, "after_update")
+@event.listens_for(SavingsGoal, "after_delete")
+@event.listens_for(WatchlistItem, "after_insert")
+@event.listens_for(WatchlistItem, "after_delete")
+def _collect_changed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if target.user_id is not None and session is not None:
+        invalidate_user_context_on_commit(session, target.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session) -> None:
+    for user_id in session.info.pop(_CHANGED_CONTEXTS, ()):
+        invalidate_user_context(user_id)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_uncommitted(session, transaction) -> None:
+    # rolled back: the cached contexts are still current
+    if transaction.parent is None:
+        session.info.pop(_CHANGED_CONTEXTS, None)
+
+
+def _format_goal(goal) -> str:
+    line = f"- {goal.goal_name}: {goal.current_amount or 0:.0f} of {goal.target_amount:.0f} saved, by {goal.target_date:%Y-%m}"
+    if not goal.investing:
+        return line
+    details = ["investing"]
+    if goal.risk_tolerance:
+        details.append(f"{goal.risk_tolerance} risk")
+    if goal.expected_return is not None:
+        details.append(f"expects {goal.expected_return:g}%/yr")
+    return f"{line} ({', '.join(details)})"
+
+
+def _build_user_context(db: Session, user_id: int) -> str:
+    goals = db.query(
+        SavingsGoal.goal_name, SavingsGoal.target_amount, SavingsGoal.current_amount, SavingsGoal.target_date,
+        SavingsGoal.investing, SavingsGoal.risk_tolerance, SavingsGoal.expected_return,
+    ).filter(SavingsGoal.user_id == user_id).order_by(SavingsGoal.target_date).limit(CONTEXT_MAX_GOALS).all()
+    symbols = [symbol for (symbol,) in db.query(WatchlistItem.symbol).filter(
+        WatchlistItem.user_id == user_id).order_by(WatchlistItem.id).limit(CONTEXT_MAX_SYMBOLS) if symbol]
+
+    lines = []
+    if goals:
+        lines.append("Savings goals:")
+        lines.extend(_format_goal(goal) for goal in goals)
+    if symbols:
+        lines.append("Watchlist: " + ", ".join(symbols))
+    return "\n".join(lines)
+
+
+def get_user_context(db: Session, user_id: int) -> str:
+    context = _context_cache.get(user_id)
+    if context is None:
+        context = _build_user_context(db, user_id)
+        _context_cache.set(user_id, context)
+    return context
+
+
+def get_session(db: Session, user_id: int, session_id: int) -> ChatSession:
+    session = db.query(ChatSession).filter_by(id=session_id, user_id=user_id).first()
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return session
+
+
+def create_session(db: Session, user_id: int, title: Optional[str] = None) -> ChatSession:
+    session = ChatSession(user_id=user_id, title=title)
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def delete_session(db: Session, user_id: int, session_id: int) -> None:
+    session = get_session(db, user_id, session_id)
+    db.query(ChatMessage).filter(ChatMessage.session_id == session.id).delete(synchronize_session=False)
+    db.delete(session)
+    db.commit()
+
+
+def select_history(messages: list, budget: int) -> tuple[list, int]:
+    """
+    messages are the unsummarized ones, newest first. Returns the newest that fit the budget
+    (oldest first, ready for the prompt) and the tokens of the ones that didn't.
+    """
+    kept, used = [], 0
+    for i, message in enumerate(messages):
+        if used + message.tokens > budget:
+            return kept[::-1], sum(m.tokens for m in messages[i:])
+        kept.append(message)
+        used += message.tokens
+    return kept[::-1], 0
+
+
+@dataclass
+class PreparedTurn:
+    session_id: int
+    messages: list[dict]
+    # tokens of turns that fell out of the budget and aren't in the summary yet
+    overflow_tokens: int
+
+
+def prepare_turn(db: Session, user_id: int, session_id: int, message: str) -> PreparedTurn:
+    """
+    Builds the prompt for the next turn: system prompt, the user's context, the summary of
+    older turns, the recent turns that fit the budget and the new message.
+    """
+    if len(message) > CHAT_MESSAGE_MAX_CHARS:
+        raise HTTPException(status_code=400, detail=f"Messages are limited to {CHAT_MESSAGE_MAX_CHARS} characters")
+    session = get_session(db, user_id, session_id)
+
+    query = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.tokens).filter(
+        ChatMessage.session_id == session.id)
+    if session.summarized_through is not None:
+        query = query.filter(ChatMessage.id > session.summarized_through)
+    recent = query.order_by(ChatMessage.id.desc()).limit(CHAT_HISTORY_MAX_MESSAGES).all()
+
+    summary = session.summary or ""
+    budget = CHAT_HISTORY_TOKEN_BUDGET - (estimate_tokens(summary) if summary else 0)
+    history, overflow_tokens = select_history(recent, max(budget, 0))
+
+    messages = [openai_agent.SYSTEM_PROMPT]
+    context = get_user_context(db, user_id)
+    if context:
+        messages.append({"role": "system", "content": "What the app knows about this user:\n" + context})
+    if summary:
+        messages.append({"role": "system", "content": "Summary of the earlier conversation:\n" + summary})
+    messages.extend({"role": m.role, "content": m.content} for m in history)
+    messages.append({"role": "user", "content": message})
+    return PreparedTurn(session.id, messages, overflow_tokens)
+
+
+def record_turn(session_id: int, message: str, reply: str, usage: dict) -> Optional[int]:
+    """
+    Stores both sides of a turn (own session: streamed replies finish after the request's
+    session is closed) and returns the id of the reply. A failed call leaves no dangling question.
+    None, with nothing stored, if the session was deleted while the reply was being written.
+    """
+    db = SessionLocal()
+    try:
+        session = db.get(ChatSession, session_id)
+        if session is None:
+            return None
+        now = datetime.utcnow()
+        question = ChatMessage(session_id=session_id, role="user", content=message,
+                               tokens=estimate_tokens(message), created_at=now)
+        completion_tokens = usage.get("completion_tokens")
+        answer = ChatMessage(
+            session_id=session_id,
+            role="assistant",
+            content=reply,
+            tokens=completion_tokens + MESSAGE_OVERHEAD_TOKENS if completion_tokens else estimate_tokens(reply),
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            created_at=now,
+        )
+        db.add_all([question, answer])
+        session.updated_at = now
+        if not session.title:
+            session.title = " ".join(message.split())[:TITLE_LENGTH]
+        db.commit()
+        return answer.id
+    finally:
+        db.close()
+
+
+def _summary_input(session_id: int) -> Optional[tuple]:
+    # the oldest unsummarized turns beyond the budget, at most CHAT_SUMMARY_INPUT_TOKENS of them
+    db = SessionLocal()
+    try:
+        session = db.get(ChatSession, session_id)
+        if session is None:
+            return None
+        query = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.tokens).filter(
+            ChatMessage.session_id == session_id)
+        if session.summarized_through is not None:
+            query = query.filter(ChatMessage.id > session.summarized_through)
+        recent = query.order_by(ChatMessage.id.desc()).all()
+        budget = CHAT_HISTORY_TOKEN_BUDGET - (estimate_tokens(session.summary) if session.summary else 0)
+        history, _ = select_history(recent, max(budget, 0))
+        overflow = recent[len(history):][::-1]
+
+        batch, used = [], 0
+        for message in overflow:
+            if batch and used + message.tokens > CHAT_SUMMARY_INPUT_TOKENS:
+                break
+            batch.append(message)
+            used += message.tokens
+        if not batch:
+            return None
+        return session.summary, session.summarized_through, batch
+    finally:
+        db.close()
+
+
+def _save_summary(session_id: int, previous_through: Optional[int], summary: str, through: int) -> None:
+    db = SessionLocal()
+    try:
+        # only if nobody else summarized the session in the meantime
+        db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            ChatSession.summarized_through.is_(None) if previous_through is None
+            else ChatSession.summarized_through == previous_through,
+        ).update({"summary": summary, "summarized_through": through}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def summarize_session(session_id: int) -> None:
+    if session_id in _summarizing:
+        return
+    _summarizing.add(session_id)
+    try:
+        loaded = await asyncio.to_thread(_summary_input, session_id)
+        if loaded is None:
+            return
+        previous, previous_through, batch = loaded
+        summary = await openai_agent.summarize_conversation(
+            previous, [{"role": m.role, "content": m.content} for m in batch]
+        )
+        if summary:
+            await asyncio.to_thread(_save_summary, session_id, previous_through, summary, batch[-1].id)
+    except Exception:
+        # the turns are still stored, the next overflowing turn tries again
+        logger.warning("Summarizing chat session %s failed", session_id, exc_info=True)
+    finally:
+        _summarizing.discard(session_id)
+
+
+def schedule_summary(turn: PreparedTurn) -> None:
+    # after the reply: the user doesn't wait for it, meanwhile old turns are just left out
+    if turn.overflow_tokens < CHAT_SUMMARY_BATCH_TOKENS:
+        return
+    task = asyncio.create_task(summarize_session(turn.session_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
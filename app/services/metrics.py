@@ -0,0 +1,302 @@
+# request/DB/upstream instrumentation, exposed in Prometheus text format on /metrics,
+# plus a trace/span id per request that shows up in logs and is passed on to upstream calls.
+
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REGISTRY: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"] + self._samples()
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{self._labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        # read at scrape time instead of being set by the app
+        self._function = function
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                return [f"{self.name} {self._function()}"]
+            except Exception:
+                return []
+        with self._lock:
+            return [f"{self.name}{self._labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # key -> [count per bucket (last one is +Inf), sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{self.name}_bucket{self._labels(key, (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+                lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def _threadpool_in_use() -> float:
+    import anyio.to_thread
+
+    return anyio.to_thread.current_default_thread_limiter().borrowed_tokens
+
+
+def _threadpool_size() -> float:
+    import anyio.to_thread
+
+    return anyio.to_thread.current_default_thread_limiter().total_tokens
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+THREADPOOL_IN_USE = Gauge("threadpool_workers_in_use", "Threadpool workers running sync routes/dependencies.", function=_threadpool_in_use)
+THREADPOOL_SIZE = Gauge("threadpool_workers_total", "Size of the threadpool for sync routes/dependencies.", function=_threadpool_size)
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Time spent executing SQL statements.")
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request.", ("route",), buckets=QUERY_COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram("db_time_per_request_seconds", "Time spent in SQL per HTTP request.", ("route",))
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Time spent calling upstream providers.", ("provider", "operation", "outcome")
+)
+
+
+@dataclass
+class RequestContext:
+    trace_id: str
+    span_id: str
+    db_queries: int = 0
+    db_time: float = 0.0
+
+
+# mutable on purpose: sync routes run in the threadpool with a copy of the context,
+# so their DB stats have to be recorded on the shared object, not by setting the var
+current_request: ContextVar[Optional[RequestContext]] = ContextVar("current_request", default=None)
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def trace_headers() -> dict:
+    # W3C trace context for outgoing calls, so upstream logs can be matched to ours
+    context = current_request.get()
+    if context is None:
+        return {}
+    if _TRACE_ID.match(context.trace_id):
+        return {"traceparent": f"00-{context.trace_id}-{context.span_id}-01"}
+    return {"X-Request-ID": context.trace_id}
+
+
+@contextmanager
+def upstream_timer(provider: str, operation: str):
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        UPSTREAM_DURATION.observe(time.perf_counter() - started, provider=provider, operation=operation, outcome=outcome)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_QUERY_DURATION.observe(elapsed)
+    request = current_request.get()
+    if request is not None:
+        request.db_queries += 1
+        request.db_time += elapsed
+
+
+def route_template(scope) -> str:
+    # the route's path pattern (/savings/update/{goal_id}), so labels don't explode per id
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unknown")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and assigns it a trace id (taken from an incoming
+    `traceparent` / `X-Request-ID` header when present), returned as `X-Trace-Id`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or ())
+        traceparent = _TRACEPARENT.match(headers.get(b"traceparent", b"").decode("latin-1").strip().lower())
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1").strip()
+        trace_id = traceparent.group(1) if traceparent else (request_id[:64] or secrets.token_hex(16))
+        context = RequestContext(trace_id=trace_id, span_id=secrets.token_hex(8))
+        token = current_request.set(context)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-trace-id", trace_id.encode("latin-1"))]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = route_template(scope)
+            HTTP_REQUEST_DURATION.observe(elapsed, method=scope["method"], route=route, status=status)
+            DB_QUERIES_PER_REQUEST.observe(context.db_queries, route=route)
+            DB_TIME_PER_REQUEST.observe(context.db_time, route=route)
+            current_request.reset(token)
+
+
+_default_record_factory = logging.getLogRecordFactory()
+
+
+def _record_factory(*args, **kwargs):
+    record = _default_record_factory(*args, **kwargs)
+    context = current_request.get()
+    record.trace_id = context.trace_id if context else "-"
+    record.span_id = context.span_id if context else "-"
+    return record
+
+
+def configure_logging() -> None:
+    # every log record gets trace_id / span_id, usable in any formatter
+    logging.setLogRecordFactory(_record_factory)
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=LOG_LEVEL,
+            format="%(asctime)s %(levelname)s [trace=%(trace_id)s span=%(span_id)s] %(name)s: %(message)s",
+        )
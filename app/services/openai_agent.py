@@ -1,54 +1,290 @@
 # contains the core logic of the AI chatbot behind the routes (user & finance)?
 
+import hashlib
+import json
 import os
-from dotenv import load_dotenv
-import openai
+import re
+import unicodedata
+from typing import TYPE_CHECKING, AsyncIterator, Optional
 
-# Load environment variables from .env
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from app.services.cache import Cache
+from app.services.metrics import Counter, trace_headers, upstream_timer
+from app.services.ratelimit import ProviderLimiter, RetryableUpstreamError, background_priority, parse_retry_after
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI
+
+# environment variables (.env) are loaded once, by app/main.py
 
 # gpt-3.5-turbo (cheaper) or gpt-4o (smarter, more impressive), possibility of change depending on use
 MODEL = "gpt-4o"
+TEMPERATURE = 0.7
+MAX_TOKENS = 300
+# rolling summaries of long chat sessions, see chat_memory.py
+SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "250"))
+
+# seconds before an LLM call is given up on, and how often the client itself retries transient failures
+# (off by default: the rate limiter retries, and also holds back everyone else after a 429)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+
+# the account's request quota for MODEL, and how many completions (streams included) may run at once
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_BURST = float(os.getenv("OPENAI_BURST", "20"))
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "32"))
+OPENAI_QUEUE_SIZE = int(os.getenv("OPENAI_QUEUE_SIZE", "100"))
+OPENAI_MAX_WAIT = float(os.getenv("OPENAI_MAX_WAIT", "10"))
+
+# answers to (near) identical questions are reused for a while, CHAT_CACHE_TTL=0 turns this off
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "1000"))
+
+SYSTEM_PROMPT = {
+    "role": "system",
+    "content": (  # make this respond in arabic maybe?
+        "You are a friendly and culturally aware financial advisor for young people in Saudi Arabia. "
+        "You analyze the input given by the user, and recommend them stocks to invest in."
+        "Prioritize local Saudi companies/stocks, and give a brief explanation on why and why not to invest in "
+        "Get your stock information from www.saudiexchange.sa mainly, don't use other sources unless necessary."
+        "the companies you recommend."
+        "Mention how the company is doing, how it operates, what are its growth potentials, competitors, "
+        "risk levels, how it'll the user achieve their goals, and whatever else is relevant to the user."
+        "Be supportive, never judgmental. Keep advice short and practical "
+        "Respond in Arabic if user input is in Arabic, otherwise respond in English."
+        "Do not under any circumstances use any markdown or formatting tokens — no **bold**, __underline__, "
+        "*italics*, backticks, headings, bullet markers, or any other markup. Return plain unstyled text only."
+        "When the user chooses a company to invest in or asks you for more information on a specific company, "
+        "make sure to list the risk tolerance "
+        "(considerate/medium/high) and return on investment in percentage."
+    )
+}
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between a user and their financial advisor. "
+    "Merge the new messages into the summary so far. Keep the facts the advisor needs later: the user's "
+    "situation, goals, amounts, risk appetite, companies discussed and what was recommended or decided. "
+    "Drop greetings and repetition. Write in the language the user writes in, plain text, at most a short paragraph."
+)
+
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens used by LLM calls, as reported by the provider.", ("operation", "kind"))
+
+
+_client: Optional["AsyncOpenAI"] = None
+_answer_cache = Cache("chat_answers", ttl=CHAT_CACHE_TTL, maxsize=CHAT_CACHE_SIZE)
+limiter = ProviderLimiter(
+    "openai",
+    rate=OPENAI_REQUESTS_PER_MINUTE / 60,
+    burst=OPENAI_BURST,
+    concurrency=OPENAI_CONCURRENCY,
+    queue_size=OPENAI_QUEUE_SIZE,
+    max_wait=OPENAI_MAX_WAIT,
+)
+
+# arabic diacritics (tashkeel) and tatweel don't change the question
+_ARABIC_MARKS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_TRAILING_PUNCTUATION = "?!.,;:؟،؛ "
+
+
+def get_client() -> "AsyncOpenAI":
+    # created on first use (or by the app lifespan) so a missing key only fails the chat routes, not app startup
+    global _client
+    if _client is None:
+        # the openai package is slow to import, only pay for it when a client is needed
+        from openai import AsyncOpenAI
+
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,  # e.g. a local stand-in for load tests
+            timeout=OPENAI_TIMEOUT,
+            max_retries=OPENAI_MAX_RETRIES,
+        )
+    return _client
+
+
+async def warm_up() -> None:
+    # authenticated but free call, leaves a kept-alive connection in the client's pool
+    await get_client().models.list()
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def normalize_prompt(user_message: str) -> str:
+    text = unicodedata.normalize("NFKC", user_message).casefold()
+    text = _ARABIC_MARKS.sub("", text)
+    text = " ".join(text.split())
+    return text.strip(_TRAILING_PUNCTUATION)
+
+
+def _answer_cache_key(user_message: str) -> str:
+    # anything that changes the answer is part of the key
+    raw = json.dumps(
+        [MODEL, SYSTEM_PROMPT["content"], TEMPERATURE, MAX_TOKENS, normalize_prompt(user_message)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_enabled() -> bool:
+    return CHAT_CACHE_TTL > 0
+
+
+def get_chat_cache_stats() -> dict:
+    return _answer_cache.stats()
+
+
+def _build_messages(user_message: str) -> list[dict]:
+    return [
+        SYSTEM_PROMPT,
+        {"role": "user", "content": user_message}
+    ]
 
 
-def get_financial_advice_from_chatbot(user_message: str) -> str:
+def _retry_after(response: Optional["httpx.Response"]) -> Optional[float]:
+    if response is None:
+        return None
+    retry_after_ms = parse_retry_after(response.headers.get("retry-after-ms"))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+    return parse_retry_after(response.headers.get("retry-after"))
+
+
+def _retryable(e: Exception) -> Optional[RetryableUpstreamError]:
+    import openai
+
+    if isinstance(e, openai.RateLimitError):
+        # an exhausted balance is a 429 too, but waiting won't fix it
+        if getattr(e, "code", None) == "insufficient_quota":
+            return None
+        return RetryableUpstreamError(str(e), _retry_after(e.response))
+    if isinstance(e, openai.InternalServerError):
+        # 503/529: overloaded, same as being throttled
+        overloaded = e.status_code in (503, 529)
+        return RetryableUpstreamError(str(e), _retry_after(e.response), throttled=overloaded)
+    if isinstance(e, openai.APIConnectionError):
+        return RetryableUpstreamError(str(e) or type(e).__name__, throttled=False)
+    return None
+
+
+def _completion_request(operation: str, messages: list[dict], temperature: float = TEMPERATURE,
+                        max_tokens: int = MAX_TOKENS, **params):
+    # one attempt at the call, for limiter.call / limiter.holding (a stream is timed until it starts)
+    async def request():
+        try:
+            with upstream_timer("openai", operation):
+                return await get_client().chat.completions.create(
+                    model=MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    extra_headers=trace_headers(),
+                    **params
+                )
+        except Exception as e:
+            retryable = _retryable(e)
+            if retryable is None:
+                raise
+            raise retryable from e
+
+    return request
+
+
+def _record_usage(operation: str, usage) -> dict:
+    # usage is None when the provider didn't report it (e.g. a stream cut short)
+    if usage is None:
+        return {"prompt_tokens": None, "completion_tokens": None}
+    LLM_TOKENS.inc(usage.prompt_tokens, operation=operation, kind="prompt")
+    LLM_TOKENS.inc(usage.completion_tokens, operation=operation, kind="completion")
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+
+
+async def get_financial_advice_from_chatbot(user_message: str) -> str:
     """
     Sends user message to the AI chatbot and returns the assistant's response.
+    Raises UpstreamBusy when OpenAI is saturated, other errors are raised as they are.
     """
+    key = _answer_cache_key(user_message) if _cache_enabled() else None
+    if key is not None:
+        cached = await _answer_cache.aget(key)
+        if cached is not None:
+            return cached
 
-    system_prompt = {
-        "role": "system",
-        "content": (  # make this respond in arabic maybe?
-            "You are a friendly and culturally aware financial advisor for young people in Saudi Arabia. "
-            "You analyze the input given by the user, and recommend them stocks to invest in."
-            "Prioritize local Saudi companies/stocks, and give a brief explanation on why and why not to invest in "
-            "Get your stock information from www.saudiexchange.sa mainly, don't use other sources unless necessary."
-            "the companies you recommend."
-            "Mention how the company is doing, how it operates, what are its growth potentials, competitors, "
-            "risk levels, how it'll the user achieve their goals, and whatever else is relevant to the user."
-            "Be supportive, never judgmental. Keep advice short and practical "
-            "Respond in Arabic if user input is in Arabic, otherwise respond in English."
-            "Do not under any circumstances use any markdown or formatting tokens — no **bold**, __underline__, "
-            "*italics*, backticks, headings, bullet markers, or any other markup. Return plain unstyled text only."
-            "When the user chooses a company to invest in or asks you for more information on a specific company, "
-            "make sure to list the risk tolerance "
-            "(considerate/medium/high) and return on investment in percentage."
-        )
-    }
-
-    try:
-        response = openai.ChatCompletion.create(
-            model=MODEL,
-            messages=[
-                system_prompt,
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.7,
-            max_tokens=300
-        )
+    response = await limiter.call(_completion_request("chat", _build_messages(user_message)))
+    _record_usage("chat", response.usage)
+    reply = response.choices[0].message.content or ""
+    if key is not None and reply:
+        await _answer_cache.aset(key, reply)
+    return reply
 
-        return response.choices[0].message["content"]
 
-    except Exception as e:
-        return f"Sorry, I couldn't generate advice at the moment. Error: {str(e)}"
+async def stream_financial_advice_from_chatbot(user_message: str) -> AsyncIterator[str]:
+    """
+    Same as get_financial_advice_from_chatbot, but yields the response text as the model produces it.
+    Errors are raised to the caller since part of the answer may already have been sent.
+    """
+    key = _answer_cache_key(user_message) if _cache_enabled() else None
+    if key is not None:
+        cached = await _answer_cache.aget(key)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    # the slot is held until the stream is finished (or the client went away)
+    request = _completion_request(
+        "chat_stream", _build_messages(user_message), stream=True, stream_options={"include_usage": True}
+    )
+    async with limiter.holding(request) as stream:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+            if chunk.usage:
+                _record_usage("chat_stream", chunk.usage)
+
+    # only complete answers are cached
+    if key is not None and parts:
+        await _answer_cache.aset(key, "".join(parts))
+
+
+async def complete_chat(messages: list[dict]) -> tuple[str, dict]:
+    """
+    Reply to a prompt built by the caller (chat sessions: context, summary, history), with the
+    provider's token counts. Not cached, the same question means something else in another session.
+    """
+    response = await limiter.call(_completion_request("session_chat", messages))
+    return response.choices[0].message.content or "", _record_usage("session_chat", response.usage)
+
+
+async def stream_chat(messages: list[dict], usage: dict) -> AsyncIterator[str]:
+    """
+    Streaming complete_chat. The token counts arrive with the last chunk, `usage` is filled in then.
+    """
+    request = _completion_request("session_chat_stream", messages, stream=True, stream_options={"include_usage": True})
+    async with limiter.holding(request) as stream:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.usage:
+                usage.update(_record_usage("session_chat_stream", chunk.usage))
+
+
+async def summarize_conversation(summary: Optional[str], messages: list[dict]) -> str:
+    """
+    Folds messages ({"role", "content"}, oldest first) into the running summary of a session.
+    """
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    content = f"Summary so far:\n{summary}\n\nNew messages:\n{transcript}" if summary else f"Messages:\n{transcript}"
+    prompt = [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": content}]
+    # nobody is waiting on a summary, chat replies go first
+    with background_priority():
+        response = await limiter.call(
+            _completion_request("summary", prompt, temperature=0.2, max_tokens=SUMMARY_MAX_TOKENS)
+        )
+    _record_usage("summary", response.usage)
+    return (response.choices[0].message.content or "").strip()
@@ -0,0 +1,72 @@
+# opaque cursors for keyset pagination: the sort key of the last row, base64 encoded.
+
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Callable, Optional
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.db.database import SessionLocal
+
+MAX_PAGE_SIZE = 200
+STREAM_BATCH_SIZE = 1000
+# most rows a single ?stream=true response carries
+STREAM_MAX_ROWS = int(os.getenv("STREAM_MAX_ROWS", "10000"))
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list):
+            raise ValueError(cursor)
+        return values
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def decode_id_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    if len(values) != 1 or not isinstance(values[0], int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values[0]
+
+
+def _ndjson_rows(statement, cursor_for: Callable, max_rows: int):
+    # own session: the request's session is closed before a streaming body is sent
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.limit(max_rows + 1).execution_options(yield_per=STREAM_BATCH_SIZE))
+        sent, last = 0, None
+        for partition in result.partitions():
+            rows = partition[:max_rows - sent]
+            if rows:
+                yield b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+                sent += len(rows)
+                last = rows[-1]
+            if len(rows) < len(partition):
+                # more rows than one stream may carry: the last line says where to resume
+                yield orjson.dumps({"next_cursor": cursor_for(last)}) + b"\n"
+                break
+    finally:
+        db.close()
+
+
+def stream_ndjson(statement, cursor_for: Callable, max_rows: int = STREAM_MAX_ROWS) -> StreamingResponse:
+    """
+    Streams up to max_rows rows of a column-projected, keyset-ordered select as NDJSON from a
+    server side cursor. If there are more, a final {"next_cursor": ...} line (cursor_for of
+    the last row sent) resumes the stream when passed back as ?cursor=.
+    """
+    return StreamingResponse(_ndjson_rows(statement, cursor_for, max_rows), media_type="application/x-ndjson")
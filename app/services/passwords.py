@@ -0,0 +1,123 @@
+# bcrypt hashing, run in its own small process pool so login bursts don't eat the API's CPU/threadpool.
+# doesn't import the db/models so the worker processes stay light.
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+# bcrypt cost factor, stored hashes with a different cost get re-hashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# worker processes for hashing, 0 hashes inline in the calling thread
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# hashes allowed to be queued or running at once before new ones are rejected
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+HASH_RETRY_AFTER = os.getenv("PASSWORD_HASH_RETRY_AFTER", "2")
+# start the worker processes with the app instead of on the first login
+HASH_WARM = os.getenv("PASSWORD_HASH_WARM", "true").lower() in ("1", "true", "yes")
+
+
+@lru_cache(maxsize=None)
+def get_context():
+    # passlib/bcrypt are imported on first use, in whichever process does the hashing
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+
+def _hash(password: str) -> str:
+    return get_context().hash(password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    return get_context().verify_and_update(plain_password, hashed_password)
+
+
+def _warm() -> bool:
+    get_context()
+    return True
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: the API process has threads running
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in attempts right now, please try again shortly",
+        headers={"Retry-After": HASH_RETRY_AFTER},
+    )
+
+
+def _run(fn, *args):
+    if HASH_WORKERS <= 0:
+        return fn(*args)
+    # fail fast instead of piling up waiting threads when the pool is saturated
+    if not _slots.acquire(blocking=False):
+        raise _busy()
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    # the slot is held until the job is really done, a timed out caller doesn't free it
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError:
+        # still queued: drop it (that releases the slot too)
+        future.cancel()
+        raise _busy()
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash, password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Returns (valid, new_hash). new_hash is set when the stored hash was made with
+    outdated parameters and should replace it.
+    """
+    return _run(_verify_and_update, plain_password, hashed_password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    valid, _ = verify_and_update_password(plain_password, hashed_password)
+    return valid
+
+
+def start() -> None:
+    """
+    Spawns the worker processes and loads bcrypt in each, so the first logins after a
+    deploy don't wait for process start-up.
+    """
+    if HASH_WORKERS <= 0:
+        get_context()
+        return
+    executor = _get_executor()
+    for future in [executor.submit(_warm) for _ in range(HASH_WORKERS)]:
+        future.result(timeout=60)
+
+
+def shutdown() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
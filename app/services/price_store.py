@@ -0,0 +1,225 @@
+# local OHLCV history: one NumPy structured array per symbol and interval on disk
+# (<PRICE_STORE_DIR>/<interval>/<SYMBOL>.npy), read memory-mapped, refreshed incrementally
+# from Twelve Data's /time_series so only bars newer than the last stored one are fetched.
+
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.services import stocks
+from app.services.cache import TTLCache
+from app.services.metrics import upstream_timer
+from app.services.ratelimit import BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join("data", "prices"))
+# don't ask upstream for new bars more often than this, even for intraday intervals
+PRICE_REFRESH_MAX_AGE = float(os.getenv("PRICE_REFRESH_MAX_AGE", "900"))
+# bars per /time_series call (Twelve Data's maximum)
+HISTORY_OUTPUT_SIZE = int(os.getenv("PRICE_HISTORY_OUTPUT_SIZE", "5000"))
+
+BAR_DTYPE = np.dtype([
+    ("time", "<i8"),  # bar open, unix seconds UTC
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+FIELDS = BAR_DTYPE.names[1:]
+
+# Twelve Data interval -> seconds per bar
+INTERVALS = {
+    "1min": 60,
+    "5min": 300,
+    "15min": 900,
+    "30min": 1800,
+    "1h": 3600,
+    "4h": 14400,
+    "1day": 86400,
+    "1week": 604800,
+    "1month": 2592000,
+}
+
+_SYMBOL = re.compile(r"^[A-Z0-9][A-Z0-9._:-]{0,31}$")
+
+# series whose last upstream check is remembered; forgetting one only costs an early re-check
+PRICE_TRACKED_SERIES = int(os.getenv("PRICE_TRACKED_SERIES", "10000"))
+
+# (symbol, interval) -> monotonic time of the last upstream check, gone once it's stale anyway
+_checked = TTLCache(maxsize=PRICE_TRACKED_SERIES, ttl=PRICE_REFRESH_MAX_AGE)
+# one refresh at a time per series, concurrent readers wait for it instead of fetching too;
+# (lock, callers holding or waiting), dropped when the last one is done
+_locks: dict[tuple, list] = {}
+
+
+@asynccontextmanager
+async def _series_lock(key: tuple):
+    entry = _locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _locks[key]
+
+
+def _series_key(symbol: str, interval: str) -> tuple:
+    key = stocks._cache_key(symbol)
+    if not _SYMBOL.match(key):
+        raise HTTPException(status_code=400, detail="Invalid symbol")
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Interval must be one of: {', '.join(INTERVALS)}")
+    return key, interval
+
+
+def _path(key: tuple) -> str:
+    symbol, interval = key
+    return os.path.join(PRICE_STORE_DIR, interval, f"{symbol}.npy")
+
+
+def _load(key: tuple) -> np.ndarray:
+    try:
+        # memory-mapped: a range query only pages in the rows it touches
+        return np.load(_path(key), mmap_mode="r")
+    except FileNotFoundError:
+        return np.empty(0, dtype=BAR_DTYPE)
+
+
+def _save(key: tuple, bars: np.ndarray) -> None:
+    # write next to the target then rename, so readers never see a half written file
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, bars)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _parse_time(value: str) -> int:
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _to_bars(values: list[dict]) -> np.ndarray:
+    bars = np.empty(len(values), dtype=BAR_DTYPE)
+    bars["time"] = [_parse_time(v["datetime"]) for v in values]
+    for name in FIELDS:
+        bars[name] = [float(v.get(name) or "nan") for v in values]
+    return bars[np.argsort(bars["time"], kind="stable")]
+
+
+def merge_bars(stored: np.ndarray, fetched: np.ndarray) -> np.ndarray:
+    """
+    Appends fetched bars to the stored ones; fetched bars replace stored bars from the first
+    fetched timestamp on (the last stored bar may have been incomplete when it was saved).
+    """
+    if fetched.size == 0:
+        return stored
+    keep = np.searchsorted(stored["time"], fetched["time"][0], side="left")
+    return np.concatenate([np.asarray(stored[:keep]), fetched])
+
+
+async def _request_series(symbol: str, interval: str, start: Optional[int], priority: Optional[int] = None) -> np.ndarray:
+    params = {
+        "symbol": symbol,
+        "interval": interval,
+        "apikey": stocks.API_KEY,
+        "timezone": "UTC",
+        "order": "ASC",
+        "outputsize": HISTORY_OUTPUT_SIZE,
+    }
+    if start is not None:
+        params["start_date"] = datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    async def request() -> dict:
+        with upstream_timer("twelvedata", "time_series"):
+            return await stocks.get_json("/time_series", params)
+
+    data = await stocks.limiter.call(request, priority=priority)
+    if stocks._is_error(data):
+        # nothing after start_date is reported as an error too
+        if start is not None and "no data" in str(data.get("message", "")).lower():
+            return np.empty(0, dtype=BAR_DTYPE)
+        raise HTTPException(status_code=502, detail=data.get("message", "History unavailable"))
+    return _to_bars(data.get("values") or [])
+
+
+def _is_stale(key: tuple) -> bool:
+    checked = _checked.get(key)
+    return checked is None or time.monotonic() - checked >= min(INTERVALS[key[1]], PRICE_REFRESH_MAX_AGE)
+
+
+async def refresh(symbol: str, interval: str = "1day", force: bool = False) -> np.ndarray:
+    """
+    Brings the stored series up to date and returns it. Only bars from the last stored
+    one on are requested; a failed refresh keeps serving what is stored.
+    """
+    key = _series_key(symbol, interval)
+    async with _series_lock(key):
+        bars = _load(key)
+        if not force and not _is_stale(key):
+            return bars
+        start = int(bars["time"][-1]) if bars.size else None
+        # with bars on disk the refresh can yield to interactive calls (or be shed), they're served either way
+        priority = BACKGROUND if bars.size else None
+        try:
+            fetched = await _request_series(key[0], interval, start, priority)
+        except Exception as e:
+            if not bars.size:
+                raise
+            logger.warning("History refresh failed for %s %s, serving stored bars: %s", key[0], interval, e)
+            return bars
+        _checked.set(key, time.monotonic())
+        if fetched.size:
+            bars = merge_bars(bars, fetched)
+            await asyncio.to_thread(_save, key, bars)
+            bars = _load(key)
+        return bars
+
+
+def read_range(bars: np.ndarray, start: Optional[datetime] = None, end: Optional[datetime] = None) -> np.ndarray:
+    # bars are sorted by time, so a range is two binary searches and a slice
+    times = bars["time"]
+    lo = np.searchsorted(times, _timestamp(start), side="left") if start else 0
+    hi = np.searchsorted(times, _timestamp(end), side="right") if end else times.size
+    return bars[lo:hi]
+
+
+def _timestamp(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def to_columns(bars: np.ndarray) -> dict:
+    # columnar, the shape chart libraries want and much smaller than a list of objects
+    columns = {"time": bars["time"].tolist()}
+    for name in FIELDS:
+        values = bars[name].astype(object)
+        values[np.isnan(bars[name])] = None
+        columns[name] = values.tolist()
+    return columns
+
+
+async def get_history(symbol: str, interval: str = "1day", start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, refresh_stale: bool = True) -> dict:
+    key = _series_key(symbol, interval)
+    bars = await refresh(symbol, interval) if refresh_stale else _load(key)
+    selected = read_range(bars, start, end)
+    return {"symbol": key[0], "interval": interval, "bars": to_columns(selected)}
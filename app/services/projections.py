@@ -0,0 +1,211 @@
+# savings goal projections: deterministic growth paths, required monthly contribution and
+# Monte Carlo outcome distributions, computed with NumPy across many goals at once.
+
+import os
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.savings import SavingsGoal
+
+DEFAULT_SIMULATIONS = int(os.getenv("PROJECTION_SIMULATIONS", "1000"))
+MAX_SIMULATIONS = 10_000
+# goals simulated together; bounds memory at BATCH_CHUNK_SIZE x simulations floats
+BATCH_CHUNK_SIZE = int(os.getenv("PROJECTION_BATCH_CHUNK_SIZE", "500"))
+# longest horizon projected (target dates are user input, year 9999 would be ~95k months of work);
+# goals further out are projected to this point
+MAX_PROJECTION_MONTHS = int(os.getenv("MAX_PROJECTION_MONTHS", "600"))
+
+# annual volatility per risk tolerance (values used by the app / advisor: considerate, medium, high)
+RISK_VOLATILITY = {
+    "low": 0.06,
+    "considerate": 0.06,
+    "conservative": 0.06,
+    "medium": 0.12,
+    "moderate": 0.12,
+    "high": 0.20,
+}
+DEFAULT_VOLATILITY = 0.12
+# expected annual return (%) for investing goals that didn't set one
+DEFAULT_INVESTING_RETURN = 6.0
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+GOAL_COLUMNS = (
+    SavingsGoal.id, SavingsGoal.user_id, SavingsGoal.goal_name, SavingsGoal.target_amount, SavingsGoal.target_date,
+    SavingsGoal.current_amount, SavingsGoal.investing, SavingsGoal.expected_return, SavingsGoal.interest_type,
+    SavingsGoal.risk_tolerance,
+)
+
+
+@dataclass
+class GoalArrays:
+    ids: np.ndarray
+    names: list
+    current: np.ndarray
+    target: np.ndarray
+    months: np.ndarray  # whole months left until target_date, at most MAX_PROJECTION_MONTHS
+    annual_rate: np.ndarray  # fraction, e.g. 0.06
+    compound: np.ndarray  # False for simple interest
+    volatility: np.ndarray  # annual, 0 for plain savings
+
+
+def _months_between(start: date, end: date) -> int:
+    months = (end.year - start.year) * 12 + (end.month - start.month) - (1 if end.day < start.day else 0)
+    return max(months, 0)
+
+
+def goal_arrays(rows: Iterable, today: Optional[date] = None) -> GoalArrays:
+    today = today or date.today()
+    rows = list(rows)
+    rates, volatility = [], []
+    for row in rows:
+        expected = row.expected_return
+        if expected is None:
+            expected = DEFAULT_INVESTING_RETURN if row.investing else 0.0
+        rates.append(expected / 100)
+        if row.investing:
+            volatility.append(RISK_VOLATILITY.get((row.risk_tolerance or "").strip().lower(), DEFAULT_VOLATILITY))
+        else:
+            volatility.append(0.0)
+
+    return GoalArrays(
+        ids=np.array([row.id for row in rows], dtype=np.int64),
+        names=[row.goal_name for row in rows],
+        current=np.array([row.current_amount or 0.0 for row in rows], dtype=np.float64),
+        target=np.array([row.target_amount for row in rows], dtype=np.float64),
+        months=np.array([min(_months_between(today, row.target_date), MAX_PROJECTION_MONTHS) for row in rows],
+                        dtype=np.int64),
+        annual_rate=np.array(rates, dtype=np.float64),
+        compound=np.array([(row.interest_type or "compound").strip().lower() != "simple" for row in rows], dtype=bool),
+        volatility=np.array(volatility, dtype=np.float64),
+    )
+
+
+def _growth_factors(goals: GoalArrays, t: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    For month counts `t` (broadcastable against the goals), returns (G, A) such that the value
+    after t months is current * G + monthly_contribution * A (contributions at month end).
+    """
+    monthly = (goals.annual_rate / 12)[:, None]
+    compound = goals.compound[:, None]
+    t = np.asarray(t, dtype=np.float64)
+
+    compound_g = (1 + monthly) ** t
+    safe_monthly = np.where(monthly == 0, 1.0, monthly)
+    compound_a = np.where(monthly == 0, t, (compound_g - 1) / safe_monthly)
+
+    # simple interest: every deposit earns rate * months it has been in
+    simple_g = 1 + monthly * t
+    simple_a = t + monthly * t * (t - 1) / 2
+
+    return np.where(compound, compound_g, simple_g), np.where(compound, compound_a, simple_a)
+
+
+def deterministic_paths(goals: GoalArrays, contribution: np.ndarray) -> np.ndarray:
+    """
+    Month by month expected values, shape (goals, max months + 1); NaN past each goal's date.
+    """
+    t = np.arange(int(goals.months.max(initial=0)) + 1)[None, :]
+    g, a = _growth_factors(goals, t)
+    paths = goals.current[:, None] * g + contribution[:, None] * a
+    return np.where(t <= goals.months[:, None], paths, np.nan)
+
+
+def required_contributions(goals: GoalArrays) -> np.ndarray:
+    """
+    Monthly deposit needed to hit the target exactly on the target date (NaN when the date
+    has passed and the target wasn't reached).
+    """
+    g, a = _growth_factors(goals, goals.months[:, None])
+    g, a = g[:, 0], a[:, 0]
+    shortfall = goals.target - goals.current * g
+    with np.errstate(divide="ignore", invalid="ignore"):
+        needed = np.where(a > 0, shortfall / a, np.nan)
+    needed = np.where(shortfall <= 0, 0.0, needed)
+    return np.maximum(needed, 0.0, where=~np.isnan(needed), out=needed)
+
+
+def simulate_final_values(goals: GoalArrays, contribution: np.ndarray, simulations: int,
+                          rng: np.random.Generator) -> np.ndarray:
+    """
+    Value at the target date for each goal and simulation, shape (goals, simulations).
+    Investing goals with compound growth follow monthly lognormal returns with a volatility set
+    by risk tolerance; everything else is deterministic.
+    """
+    g, a = _growth_factors(goals, goals.months[:, None])
+    final = np.repeat(goals.current * g[:, 0] + contribution * a[:, 0], simulations).reshape(-1, simulations)
+
+    stochastic = np.flatnonzero(goals.compound & (goals.volatility > 0) & (goals.months > 0))
+    if stochastic.size == 0:
+        return final
+
+    months = goals.months[stochastic][:, None]
+    sigma = (goals.volatility[stochastic] / np.sqrt(12))[:, None]
+    # mean monthly growth matches the deterministic path (1 + rate / 12)
+    drift = np.log1p(goals.annual_rate[stochastic] / 12)[:, None] - sigma ** 2 / 2
+    deposit = contribution[stochastic][:, None]
+
+    values = np.repeat(goals.current[stochastic][:, None], simulations, axis=1)
+    # one step per month across every goal and simulation at once
+    for month in range(int(months.max())):
+        growth = np.exp(drift + sigma * rng.standard_normal(values.shape))
+        values = np.where(month < months, values * growth + deposit, values)
+
+    final[stochastic] = values
+    return final
+
+
+def project_goals(rows: Iterable, monthly_contribution: float = 0.0, simulations: int = DEFAULT_SIMULATIONS,
+                  seed=None, include_path: bool = True, today: Optional[date] = None) -> list[dict]:
+    goals = goal_arrays(rows, today)
+    if goals.ids.size == 0:
+        return []
+
+    contribution = np.full(goals.ids.shape, float(monthly_contribution))
+    rng = np.random.default_rng(seed)
+
+    required = required_contributions(goals)
+    final = simulate_final_values(goals, contribution, simulations, rng)
+    probability = (final >= goals.target[:, None]).mean(axis=1)
+    percentiles = np.percentile(final, PERCENTILES, axis=1)
+    paths = deterministic_paths(goals, contribution) if include_path else None
+
+    results = []
+    for i, goal_id in enumerate(goals.ids.tolist()):
+        months = int(goals.months[i])
+        result = {
+            "goal_id": goal_id,
+            "goal_name": goals.names[i],
+            "months_remaining": months,
+            "target_amount": float(goals.target[i]),
+            "current_amount": float(goals.current[i]),
+            "expected_final_amount": round(float(final[i].mean()), 2),
+            "required_monthly_contribution": None if np.isnan(required[i]) else round(float(required[i]), 2),
+            "probability_of_reaching_target": round(float(probability[i]), 4),
+            "final_amount_percentiles": {f"p{p}": round(float(percentiles[j, i]), 2) for j, p in enumerate(PERCENTILES)},
+        }
+        if paths is not None:
+            result["path"] = np.round(paths[i, :months + 1], 2).tolist()
+        results.append(result)
+    return results
+
+
+def project_all_goals(db: Session, monthly_contribution: float = 0.0, simulations: int = DEFAULT_SIMULATIONS,
+                      seed: Optional[int] = None, chunk_size: int = BATCH_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Batch job version: every goal in the system, streamed from the DB and simulated in chunks.
+    """
+    # independent random stream per chunk, still reproducible from one seed
+    seeds = np.random.SeedSequence(seed)
+    statement = select(*GOAL_COLUMNS).order_by(SavingsGoal.id).execution_options(yield_per=chunk_size)
+    for partition in db.execute(statement).partitions():
+        (chunk_seed,) = seeds.spawn(1)
+        results = project_goals(partition, monthly_contribution, simulations, seed=chunk_seed, include_path=False)
+        for row, result in zip(partition, results):
+            result["user_id"] = row.user_id
+            yield result
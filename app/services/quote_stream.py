@@ -0,0 +1,99 @@
+# live quote fan-out: one poller per symbol, shared by every connected subscriber.
+
+import asyncio
+import logging
+import os
+from typing import Iterable
+
+from app.services.ratelimit import UpstreamBusy, background_priority
+from app.services.stocks import get_stock_price
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.getenv("STOCK_STREAM_POLL_INTERVAL", "15"))
+# updates buffered per subscriber before the oldest ones get dropped (slow clients)
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("STOCK_STREAM_QUEUE_SIZE", "100"))
+
+
+def _offer(queue: asyncio.Queue, item) -> None:
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
+
+
+class QuoteHub:
+    """
+    Keeps one polling task per subscribed symbol. Each subscriber holds a reference on its
+    symbols; the poller for a symbol stops once the last subscriber for it leaves, so upstream
+    load grows with distinct symbols rather than with connected clients.
+    """
+
+    def __init__(self, interval: float = POLL_INTERVAL):
+        self.interval = interval
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._pollers: dict[str, asyncio.Task] = {}
+        self._latest: dict[str, dict] = {}
+
+    @staticmethod
+    def _keys(symbols: Iterable[str]) -> set[str]:
+        return {s.strip().upper() for s in symbols if s and s.strip()}
+
+    def subscribe(self, symbols: Iterable[str]) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        for key in self._keys(symbols):
+            self._subscribers.setdefault(key, set()).add(queue)
+            # new subscribers get the last known price right away
+            if key in self._latest:
+                _offer(queue, self._latest[key])
+            if key not in self._pollers:
+                self._pollers[key] = asyncio.create_task(self._poll(key))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, symbols: Iterable[str]) -> None:
+        for key in self._keys(symbols):
+            subscribers = self._subscribers.get(key)
+            if subscribers is None:
+                continue
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[key]
+                self._latest.pop(key, None)
+                poller = self._pollers.pop(key, None)
+                if poller is not None:
+                    poller.cancel()
+
+    def subscriber_count(self, symbol: str) -> int:
+        return len(self._subscribers.get(symbol.strip().upper(), ()))
+
+    async def _poll(self, key: str) -> None:
+        # polls are background work: requests from users get Twelve Data credits first
+        with background_priority():
+            while True:
+                try:
+                    quote = await get_stock_price(key)
+                except UpstreamBusy as e:
+                    logger.info("Polling quote for %s skipped: %s", key, e)
+                    quote = None
+                except Exception:
+                    logger.warning("Polling quote for %s failed", key, exc_info=True)
+                    quote = None
+
+                # only changes are pushed
+                if quote and quote.get("price") is not None and quote != self._latest.get(key):
+                    self._latest[key] = quote
+                    for queue in list(self._subscribers.get(key, ())):
+                        _offer(queue, quote)
+
+                await asyncio.sleep(self.interval)
+
+    async def close(self) -> None:
+        pollers = list(self._pollers.values())
+        for poller in pollers:
+            poller.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+        self._pollers.clear()
+        self._subscribers.clear()
+        self._latest.clear()
+
+
+quote_hub = QuoteHub()
@@ -0,0 +1,258 @@
+# admission control for upstream providers (Twelve Data, OpenAI): a token bucket sized to the
+# provider's quota, a cap on concurrent calls and a priority queue, so interactive requests get
+# the quota before background refreshes do. A 429 pauses the whole provider until its
+# Retry-After instead of every caller retrying on its own, retries back off with jitter, and
+# calls that can't get through in time are shed as UpstreamBusy (503 + Retry-After).
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.services.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# retries after a 429 / overloaded / connection error, and the backoff between them
+RETRY_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "8"))
+
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "upstream_queue_wait_seconds", "Time spent waiting for an upstream rate limit slot.", ("provider", "priority")
+)
+UPSTREAM_RETRIES = Counter("upstream_retries_total", "Upstream calls retried after a retryable error.", ("provider",))
+UPSTREAM_SHED = Counter(
+    "upstream_shed_total", "Upstream calls rejected because the provider was saturated.", ("provider", "priority")
+)
+
+T = TypeVar("T")
+
+# background work (pollers, refreshes) sets this for everything it calls
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def background_priority():
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RetryableUpstreamError(Exception):
+    """
+    Raised by a request function for errors worth another try: throttled (429 / overloaded)
+    or a dropped connection. retry_after is the provider's hint in seconds, if it gave one.
+    """
+
+    def __init__(self, detail: str = "", retry_after: Optional[float] = None, throttled: bool = True):
+        super().__init__(detail or "Upstream asked to retry later")
+        self.retry_after = retry_after
+        self.throttled = throttled
+
+
+class UpstreamBusy(Exception):
+    """
+    The provider is saturated (or keeps refusing) and the call was not made; turned into a
+    503 with Retry-After by the app.
+    """
+
+    def __init__(self, provider: str, retry_after: float, detail: str = ""):
+        super().__init__(detail or f"{provider} is busy, try again later")
+        self.provider = provider
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # either delta seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    # "full jitter": callers that failed together don't come back together
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+class ProviderLimiter:
+    """
+    rate is calls (quota units) per second, burst the bucket size. Waiters are served by
+    priority, then in arrival order. A request is shed straight away when its estimated wait
+    is longer than max_wait or the queue is full; background requests only get half the queue,
+    the rest is kept for interactive ones.
+    """
+
+    def __init__(self, provider: str, rate: float, burst: float, concurrency: int,
+                 queue_size: int = 100, max_wait: float = 10.0):
+        self.provider = provider
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # (priority, arrival, cost, future)
+        self._waiters: list[tuple] = []
+        self._arrivals = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _estimated_wait(self, priority: int, cost: float, now: float) -> float:
+        ahead = sum(waiter[2] for waiter in self._waiters if waiter[0] <= priority)
+        return max(0.0, self._paused_until - now, (ahead + cost - self._tokens) / self.rate)
+
+    def _dispatch(self) -> None:
+        # hands out slots to the head of the queue, or sets a timer for when the bucket has refilled
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters and self.in_flight < self.concurrency:
+            priority, _, cost, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            delay = max(self._paused_until - now, (cost - self._tokens) / self.rate)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._tokens -= cost
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _shed(self, priority: int, retry_after: float, detail: str = "") -> UpstreamBusy:
+        UPSTREAM_SHED.inc(provider=self.provider, priority=PRIORITY_NAMES[priority])
+        return UpstreamBusy(self.provider, retry_after, detail)
+
+    async def acquire(self, priority: Optional[int] = None, cost: float = 1.0) -> None:
+        priority = _priority.get() if priority is None else priority
+        # a batch bigger than the bucket would never fit, it just takes the whole bucket
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        self._refill(now)
+        if (not self._waiters and self.in_flight < self.concurrency
+                and self._paused_until <= now and self._tokens >= cost):
+            self._tokens -= cost
+            self.in_flight += 1
+            return
+
+        wait = self._estimated_wait(priority, cost, now)
+        queue_limit = self.queue_size if priority == INTERACTIVE else self.queue_size // 2
+        if wait > self.max_wait or len(self._waiters) >= queue_limit:
+            raise self._shed(priority, max(wait, 1.0))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._arrivals), cost, future)
+        heapq.heappush(self._waiters, entry)
+        self._dispatch()
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # granted just as the caller gave up
+                self.release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed(priority, self._estimated_wait(priority, cost, time.monotonic()) or 1.0) from None
+            raise
+        finally:
+            UPSTREAM_QUEUE_WAIT.observe(
+                time.monotonic() - started, provider=self.provider, priority=PRIORITY_NAMES[priority]
+            )
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        if self._waiters:
+            self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        # the provider's quota is used up: nobody calls it until it has reset
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        if self._waiters:
+            self._dispatch()
+
+    async def _run(self, request: Callable[[], Awaitable[T]], priority: Optional[int], cost: float) -> T:
+        # returns with the slot still taken, the caller releases it
+        priority = _priority.get() if priority is None else priority
+        error: Optional[RetryableUpstreamError] = None
+        for attempt in range(RETRY_ATTEMPTS + 1):
+            await self.acquire(priority, cost)
+            try:
+                return await request()
+            except RetryableUpstreamError as e:
+                self.release()
+                error = e
+            except BaseException:
+                self.release()
+                raise
+
+            delay = error.retry_after if error.retry_after is not None else _backoff(attempt)
+            if error.throttled:
+                # even without a hint, the whole provider backs off, not just this caller
+                self.pause(delay)
+            if attempt == RETRY_ATTEMPTS or delay > self.max_wait:
+                break
+            UPSTREAM_RETRIES.inc(provider=self.provider)
+            logger.info("%s: %s, retrying in %.2fs", self.provider, error, delay)
+            if not error.throttled:
+                await asyncio.sleep(delay)  # throttled calls wait in acquire() until the pause is over
+
+        retry_after = error.retry_after if error.retry_after is not None else RETRY_MAX_DELAY
+        raise self._shed(priority, retry_after, str(error))
+
+    async def call(self, request: Callable[[], Awaitable[T]], priority: Optional[int] = None,
+                   cost: float = 1.0) -> T:
+        """
+        Runs request() once a slot is free, retrying RetryableUpstreamError with jittered
+        backoff (or after the provider's Retry-After). cost is in quota units, e.g. one
+        per symbol of a batched quote call.
+        """
+        result = await self._run(request, priority, cost)
+        self.release()
+        return result
+
+    @asynccontextmanager
+    async def holding(self, request: Callable[[], Awaitable[T]], priority: Optional[int] = None,
+                      cost: float = 1.0):
+        # like call(), but the slot stays taken until the block exits, e.g. while a stream is read
+        result = await self._run(request, priority, cost)
+        try:
+            yield result
+        finally:
+            self.release()
@@ -0,0 +1,105 @@
+# keeps the per-user savings summary row (total saved, active goals, goal count) in sync with the goals.
+
+import os
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.savings import SavingsGoal
+from app.models.savings_summary import SavingsSummary
+
+# when off, the dashboard aggregates the goals table on every request instead
+SAVINGS_SUMMARY_ENABLED = os.getenv("SAVINGS_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def is_active(current_amount, target_amount) -> bool:
+    return (current_amount or 0.0) < target_amount
+
+
+def compute_summary(db: Session, user_id: int) -> dict:
+    # one aggregate query, no goal rows are loaded
+    total_saved, goal_count, active_goals = db.query(
+        func.coalesce(func.sum(SavingsGoal.current_amount), 0.0),
+        func.count(SavingsGoal.id),
+        func.coalesce(func.sum(case((SavingsGoal.current_amount < SavingsGoal.target_amount, 1), else_=0)), 0),
+    ).filter(SavingsGoal.user_id == user_id).one()
+    return {
+        "total_saved": float(total_saved),
+        "active_goals": int(active_goals),
+        "goal_count": int(goal_count),
+    }
+
+
+def _insert_if_absent(db: Session, user_id: int, summary: dict) -> bool:
+    """
+    Creates the user's summary row unless another transaction already did; True if this one did.
+    Two first requests for the same user can race here, so it's an insert-or-nothing, not select-then-insert.
+    """
+    values = dict(summary, user_id=user_id)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(SavingsSummary).values(**values).on_conflict_do_nothing(index_elements=["user_id"])
+        return db.execute(statement).rowcount == 1
+    if dialect == "mysql":
+        return db.execute(insert(SavingsSummary).values(**values).prefix_with("IGNORE")).rowcount == 1
+    try:
+        with db.begin_nested():
+            db.execute(insert(SavingsSummary).values(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+def apply_summary_delta(db: Session, user_id: int, total_saved: float = 0.0, active_goals: int = 0, goal_count: int = 0) -> None:
+    """
+    Adjusts the summary in the caller's transaction. Call it before the caller commits.
+    """
+    if not SAVINGS_SUMMARY_ENABLED:
+        return
+    delta = (
+        update(SavingsSummary)
+        .where(SavingsSummary.user_id == user_id)
+        .values(
+            total_saved=SavingsSummary.total_saved + total_saved,
+            active_goals=SavingsSummary.active_goals + active_goals,
+            goal_count=SavingsSummary.goal_count + goal_count,
+        )
+    )
+    if db.execute(delta).rowcount:
+        return
+    # no row yet (existing users): build it from the goals, this change included
+    db.flush()
+    if not _insert_if_absent(db, user_id, compute_summary(db, user_id)):
+        # created concurrently from the committed goals, which don't include this change yet
+        db.execute(delta)
+
+
+def _materialize(user_id: int) -> dict:
+    # own session: a read shouldn't commit the request's session as a side effect
+    db = SessionLocal()
+    try:
+        summary = compute_summary(db, user_id)
+        _insert_if_absent(db, user_id, summary)
+        db.commit()
+        return summary
+    finally:
+        db.close()
+
+
+def get_summary(db: Session, user_id: int) -> dict:
+    if not SAVINGS_SUMMARY_ENABLED:
+        return compute_summary(db, user_id)
+    row = db.get(SavingsSummary, user_id)
+    if row is None:
+        return _materialize(user_id)
+    return {
+        "total_saved": row.total_saved,
+        "active_goals": row.active_goals,
+        "goal_count": row.goal_count,
+    }
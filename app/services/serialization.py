@@ -0,0 +1,26 @@
+# fast JSON for large responses: validate rows straight from attributes and dump to bytes
+# in pydantic-core, skipping FastAPI's response validation + jsonable_encoder round trip.
+
+from functools import lru_cache
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def _adapter(tp) -> TypeAdapter:
+    # building a TypeAdapter compiles its validator/serializer, so keep one per type
+    return TypeAdapter(tp)
+
+
+def dump_json(tp, data: Any) -> bytes:
+    adapter = _adapter(tp)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def json_response(tp, data: Any, status_code: int = 200) -> Response:
+    """
+    `tp` is the route's response_model; the route keeps declaring it for the OpenAPI schema.
+    """
+    return Response(dump_json(tp, data), status_code=status_code, media_type="application/json")
@@ -0,0 +1,19 @@
+# helpers for server-sent events (text/event-stream) responses.
+
+import json
+from typing import Any, Optional
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # don't let nginx buffer the stream
+}
+
+KEEP_ALIVE = ": keep-alive\n\n"
+
+
+def sse_event(data: Any, event: Optional[str] = None) -> str:
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
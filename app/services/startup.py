@@ -0,0 +1,61 @@
+# startup time per phase (imports, schema, pool warm-up, clients...), logged once the
+# worker is ready and served on /health/startup. stdlib only, so importing it first
+# doesn't skew the "imports" phase.
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    def __init__(self):
+        self.created = time.perf_counter()
+        self.phases: list[dict] = []
+        self.ready = False
+        self.total: Optional[float] = None
+        self._last = self.created
+
+    def mark(self, name: str) -> None:
+        # a phase that already happened, e.g. module imports before the lifespan ran
+        now = time.perf_counter()
+        self.phases.append({"phase": name, "seconds": round(now - self._last, 4), "ok": True})
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str, required: bool = True):
+        """
+        Times the block. A failing optional phase is logged and recorded; a failing
+        required one also keeps the worker from reporting ready.
+        """
+        started = time.perf_counter()
+        entry = {"phase": name, "seconds": None, "ok": True}
+        self.phases.append(entry)
+        try:
+            yield
+        except Exception as e:
+            entry["ok"] = False
+            entry["error"] = str(e) or type(e).__name__
+            entry["required"] = required
+            logger.warning("Startup phase %s failed: %s", name, entry["error"])
+        finally:
+            self._last = time.perf_counter()
+            entry["seconds"] = round(self._last - started, 4)
+
+    def finish(self) -> None:
+        self.total = round(time.perf_counter() - self.created, 4)
+        self.ready = all(p["ok"] or not p.get("required") for p in self.phases)
+        logger.info(
+            "Startup %s in %.3fs: %s",
+            "ready" if self.ready else "NOT ready",
+            self.total,
+            ", ".join(f"{p['phase']}={p['seconds']:.3f}s{'' if p['ok'] else ' (failed)'}" for p in self.phases),
+        )
+
+    def as_dict(self) -> dict:
+        return {"ready": self.ready, "total_seconds": self.total, "phases": self.phases}
+
+
+startup_report = StartupReport()
@@ -1,19 +1,258 @@
-import httpx
+import asyncio
+import os
+import time
+from typing import TYPE_CHECKING, Optional
+
+from fastapi import HTTPException
+
+from app.services.cache import Cache
+from app.services.metrics import trace_headers, upstream_timer
+from app.services.ratelimit import ProviderLimiter, RetryableUpstreamError, UpstreamBusy, parse_retry_after
+
+if TYPE_CHECKING:
+    import httpx
 
 # DONT FORGET TO CHOOSE THE API !!!
-API_KEY = "your_api_key_here"
-BASE_URL = "https://api.twelvedata.com"
+API_KEY = os.getenv("TWELVE_DATA_API_KEY", "your_api_key_here")
+BASE_URL = os.getenv("TWELVE_DATA_BASE_URL", "https://api.twelvedata.com")
+
+# quotes are cached for a short while so bursts on popular tickers (e.g. 2222.SR) share one upstream call
+QUOTE_CACHE_TTL = float(os.getenv("STOCK_QUOTE_CACHE_TTL", "15"))
+QUOTE_CACHE_SIZE = int(os.getenv("STOCK_QUOTE_CACHE_SIZE", "2048"))
+
+HTTP_TIMEOUT = float(os.getenv("STOCK_HTTP_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("STOCK_HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("STOCK_HTTP_MAX_KEEPALIVE", "20"))
+
+# symbols per multi-symbol /quote call, and how many Twelve Data calls may run at once
+BATCH_SIZE = int(os.getenv("STOCK_BATCH_SIZE", "50"))
+BATCH_CONCURRENCY = int(os.getenv("STOCK_BATCH_CONCURRENCY", "4"))
+MAX_SYMBOLS_PER_REQUEST = int(os.getenv("STOCK_MAX_SYMBOLS_PER_REQUEST", "200"))
+
+# the plan's API credits (one per symbol quoted / series requested), shared by quotes and history
+TWELVE_DATA_CREDITS_PER_MINUTE = float(os.getenv("TWELVE_DATA_CREDITS_PER_MINUTE", "610"))
+TWELVE_DATA_BURST = float(os.getenv("TWELVE_DATA_BURST", "60"))
+# longest a request waits for credits before it's answered with a 503
+TWELVE_DATA_MAX_WAIT = float(os.getenv("TWELVE_DATA_MAX_WAIT", "5"))
+TWELVE_DATA_QUEUE_SIZE = int(os.getenv("TWELVE_DATA_QUEUE_SIZE", "200"))
+
+_client: Optional["httpx.AsyncClient"] = None
+_quote_cache = Cache("quotes", ttl=QUOTE_CACHE_TTL, maxsize=QUOTE_CACHE_SIZE)
+# symbol -> future of the upstream call currently running for it
+_inflight: dict[str, asyncio.Future] = {}
+# keeps fetch tasks referenced until they finish
+_tasks: set[asyncio.Task] = set()
+limiter = ProviderLimiter(
+    "twelvedata",
+    rate=TWELVE_DATA_CREDITS_PER_MINUTE / 60,
+    burst=TWELVE_DATA_BURST,
+    concurrency=BATCH_CONCURRENCY,
+    queue_size=TWELVE_DATA_QUEUE_SIZE,
+    max_wait=TWELVE_DATA_MAX_WAIT,
+)
+
+
+def _build_client() -> "httpx.AsyncClient":
+    # imported here, it's only needed once a worker actually talks to Twelve Data
+    import httpx
+
+    return httpx.AsyncClient(
+        base_url=BASE_URL,
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        ),
+    )
+
+
+def get_client() -> "httpx.AsyncClient":
+    # normally created by the app lifespan, but fall back to a lazy client (scripts, tests)
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def start_client() -> None:
+    get_client()
+
+
+async def warm_up() -> None:
+    # opens (and keeps alive) a connection to Twelve Data, any response will do
+    await get_client().get("/", timeout=5)
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    # a shared cache outlives this worker, other workers are still using it
+    if not _quote_cache.backend.shared:
+        await _quote_cache.aclear()
+
+
+def _cache_key(symbol: str) -> str:
+    return symbol.strip().upper()
+
+
+def _is_error(data: dict) -> bool:
+    return data.get("status") == "error"
+
+
+def read_json(response: "httpx.Response") -> dict:
+    """
+    Body of a Twelve Data response. Running out of credits comes back either as HTTP 429 or as
+    an error payload with code 429; both raise RetryableUpstreamError, credits reset every minute.
+    """
+    if response.status_code >= 500:
+        raise RetryableUpstreamError(f"Twelve Data returned {response.status_code}", throttled=False)
+    data = response.json() if response.status_code != 429 else {}
+    if response.status_code == 429 or data.get("code") == 429:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is None:
+            retry_after = 60 - time.time() % 60
+        raise RetryableUpstreamError(data.get("message", "Twelve Data rate limit reached"), retry_after)
+    return data
+
+
+async def get_json(path: str, params: dict) -> dict:
+    """
+    One Twelve Data GET, for limiter.call. A dropped or timed out connection raises
+    RetryableUpstreamError (not throttled) like a 5xx does.
+    """
+    import httpx
+
+    try:
+        response = await get_client().get(path, params=params, headers=trace_headers())
+    except httpx.TransportError as e:
+        raise RetryableUpstreamError(str(e) or type(e).__name__, throttled=False) from e
+    return read_json(response)
+
+
+def _raise_for_error(data: dict) -> None:
+    # bad/unknown symbols are the caller's problem, anything else is upstream's
+    status_code = 404 if data.get("code") in (400, 404) else 502
+    raise HTTPException(status_code=status_code, detail=data.get("message", "Quote unavailable"))
+
+
+def _to_quote(data: dict) -> dict:
+    return {
+        "symbol": data.get("symbol"),
+        "name": data.get("name"),
+        "price": data.get("price"),
+        "change": data.get("percent_change"),
+    }
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def _request_quotes(symbols: list[str]) -> dict[str, dict]:
+    # one call for the whole chunk, Twelve Data accepts comma separated symbols
+    async def request() -> dict:
+        with upstream_timer("twelvedata", "quote"):
+            return await get_json("/quote", {"symbol": ",".join(symbols), "apikey": API_KEY})
+
+    data = await limiter.call(request, cost=len(symbols))
+    # a single symbol (or a failed batch) comes back flat, a batch comes back keyed by symbol
+    if len(symbols) == 1 or _is_error(data):
+        return {_cache_key(symbol): data for symbol in symbols}
+    return {_cache_key(symbol): quote for symbol, quote in data.items()}
+
+
+async def _fetch(symbols: dict[str, str], futures: dict[str, asyncio.Future]) -> None:
+    # runs as its own task so a cancelled caller doesn't abort the call for everyone waiting on it
+    try:
+        results = await _request_quotes(list(symbols.values()))
+    except Exception as e:
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(e)
+    else:
+        fresh = {}
+        for key, future in futures.items():
+            data = results.get(key) or {"status": "error", "message": "No quote returned for symbol"}
+            # upstream error payloads aren't cached, the next request retries
+            if not _is_error(data):
+                fresh[key] = data
+            if not future.done():
+                future.set_result(data)
+        # waiters already have their quotes, callers arriving meanwhile still join the in-flight future
+        await _quote_cache.aset_many(fresh)
+    finally:
+        for key in symbols:
+            _inflight.pop(key, None)
+
+
+async def _load_quotes(symbols: list[str]) -> dict:
+    """
+    Returns raw quote payloads (or the exception raised fetching them) keyed by normalized symbol.
+    Cached symbols are served locally, the rest are fetched in chunks.
+    """
+    keys: dict[str, str] = {}
+    for symbol in symbols:
+        keys.setdefault(_cache_key(symbol), symbol)
+    # the only await before the in-flight bookkeeping below, which must not be interleaved
+    found = await _quote_cache.aget_many(list(keys))
+    waiting: dict[str, asyncio.Future] = {}
+    missing: dict[str, str] = {}
+
+    for key, symbol in keys.items():
+        if key in found:
+            continue
+
+        # concurrent misses for the same symbol wait on the same upstream call
+        future = _inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            # nobody may be left waiting if every caller got cancelled
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            _inflight[key] = future
+            missing[key] = symbol
+        waiting[key] = future
+
+    for chunk in _chunks(list(missing.items()), BATCH_SIZE):
+        task = asyncio.create_task(_fetch(dict(chunk), {key: waiting[key] for key, _ in chunk}))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+    if waiting:
+        results = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()), return_exceptions=True)
+        found.update(zip(waiting, results))
+    return found
 
 
 # might change function name later
 async def get_stock_price(symbol: str):
-    url = f"{BASE_URL}/quote?symbol={symbol}&apikey={API_KEY}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        data = response.json()
-        return {
-            "symbol": data.get("symbol"),
-            "name": data.get("name"),
-            "price": data.get("price"),
-            "change": data.get("percent_change"),
-        }
+    data = (await _load_quotes([symbol]))[_cache_key(symbol)]
+    if isinstance(data, BaseException):
+        raise data
+    if _is_error(data):
+        _raise_for_error(data)
+    return _to_quote(data)
+
+
+async def get_stock_prices(symbols: list[str]) -> dict:
+    """
+    Quotes for several symbols at once. Symbols that failed are reported under "errors"
+    instead of failing the whole batch.
+    """
+    quotes, errors = {}, {}
+    busy = None
+    for key, data in (await _load_quotes(symbols)).items():
+        if isinstance(data, BaseException):
+            errors[key] = str(data) or type(data).__name__
+            if isinstance(data, UpstreamBusy):
+                busy = data
+        elif _is_error(data):
+            errors[key] = data.get("message", "Quote unavailable")
+        else:
+            quotes[key] = _to_quote(data)
+    # nothing to show at all: a 503 with Retry-After tells the client when to come back
+    if busy is not None and not quotes:
+        raise busy
+    return {"quotes": quotes, "errors": errors}
@@ -1,9 +1,164 @@
-from app.models.transaction import Transaction
+# audit log of savings activity, written into the transactions table.
+#
+# TRANSACTION_LOG_MODE:
+#   unit_of_work (default) - the entry is added to the caller's session and committed with its changes
+#   buffered               - entries are queued in memory once the caller's session commits (dropped
+#                            if it rolls back) and bulk inserted by a background thread, whenever
+#                            TRANSACTION_LOG_FLUSH_SIZE entries are waiting or every
+#                            TRANSACTION_LOG_FLUSH_INTERVAL seconds, and once more on shutdown
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
 from datetime import datetime
 
+from sqlalchemy import event, insert
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_LOG_MODE = os.getenv("TRANSACTION_LOG_MODE", "unit_of_work")
+FLUSH_SIZE = int(os.getenv("TRANSACTION_LOG_FLUSH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.getenv("TRANSACTION_LOG_FLUSH_INTERVAL", "1.0"))
+# entries kept for retry while the database is unavailable, oldest are dropped beyond this
+MAX_BUFFERED = int(os.getenv("TRANSACTION_LOG_MAX_BUFFERED", "100000"))
+# entries the database refused (e.g. their goal was deleted meanwhile), kept for inspection
+DEAD_LETTER_SIZE = int(os.getenv("TRANSACTION_LOG_DEAD_LETTER_SIZE", "1000"))
+
+
+def _is_transient(error: Exception) -> bool:
+    # the database is unreachable / the connection broke: worth retrying the same rows later
+    return isinstance(error, OperationalError) or (isinstance(error, DBAPIError) and error.connection_invalidated)
+
+
+class BufferedLogWriter:
+    def __init__(self, flush_size: int = FLUSH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._buffer: list[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.dead_letters: deque[dict] = deque(maxlen=DEAD_LETTER_SIZE)
+
+    def _ensure_started(self) -> None:
+        if self._thread is None and not self._stopped.is_set():
+            self._thread = threading.Thread(target=self._run, name="transaction-log-writer", daemon=True)
+            self._thread.start()
+
+    def add(self, row: dict) -> None:
+        with self._lock:
+            stopped = self._stopped.is_set()
+            if not stopped:
+                self._buffer.append(row)
+                full = len(self._buffer) >= self.flush_size
+                self._ensure_started()
+        if stopped:
+            # no flusher is left to pick it up
+            self._write([row])
+            return
+        if full:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _insert(self, rows: list[dict]) -> None:
+        db = SessionLocal()
+        try:
+            # one multi-row insert (executemany)
+            db.execute(insert(Transaction), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _requeue(self, rows: list[dict]) -> None:
+        with self._lock:
+            self._buffer = rows + self._buffer
+            if len(self._buffer) > MAX_BUFFERED:
+                dropped = len(self._buffer) - MAX_BUFFERED
+                del self._buffer[:dropped]
+                logger.error("Dropped %d transaction log entries", dropped)
+
+    def _dead_letter(self, row: dict, error: Exception) -> None:
+        self.dead_letters.append(row)
+        logger.error("Transaction log entry rejected, moved to dead letters: %r (%s)", row, error)
+
+    def _write(self, rows: list[dict]) -> int:
+        """
+        Inserts rows, returns how many were written. A failed batch is retried row by row so one
+        bad entry can't hold back the rest: rows the database rejects go to the dead letters,
+        rows hit by an outage are requeued (or dead lettered once the writer has stopped).
+        """
+        try:
+            self._insert(rows)
+            return len(rows)
+        except Exception as e:
+            if _is_transient(e):
+                return self._retry_later(rows, e)
+            logger.warning("Flushing %d transaction log entries failed, retrying one by one: %s", len(rows), e)
+
+        written = 0
+        for i, row in enumerate(rows):
+            try:
+                self._insert([row])
+                written += 1
+            except Exception as e:
+                if _is_transient(e):
+                    return written + self._retry_later(rows[i:], e)
+                self._dead_letter(row, e)
+        return written
+
+    def _retry_later(self, rows: list[dict], error: Exception) -> int:
+        if self._stopped.is_set():
+            for row in rows:
+                self._dead_letter(row, error)
+        else:
+            logger.warning("Flushing %d transaction log entries failed, will retry: %s", len(rows), error)
+            self._requeue(rows)
+        return 0
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            return self._write(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+
+_writer = BufferedLogWriter()
+# session.info key for buffered entries waiting on the caller's commit
+_PENDING = "transaction_log_pending"
+# last chance flush if the process exits without the app shutdown running
+atexit.register(_writer.close)
+
 
 def log_transaction(db, user_id, transaction_type, description=None, amount=None, related_id=None):
-    tx = Transaction(
+    row = dict(
         user_id=user_id,
         type=transaction_type,
         amount=amount,
@@ -11,5 +166,26 @@ def log_transaction(db, user_id, transaction_type, description=None, amount=None
         savings_goal_id=related_id,
         timestamp=datetime.utcnow()
     )
-    db.add(tx)
-    db.commit()
+    if TRANSACTION_LOG_MODE == "buffered":
+        # handed to the writer only if the change being logged is committed
+        db.info.setdefault(_PENDING, []).append(row)
+        return
+    # committed by the caller together with the change being logged
+    db.add(Transaction(**row))
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_committed(session) -> None:
+    for row in session.info.pop(_PENDING, ()):
+        _writer.add(row)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_uncommitted(session, transaction) -> None:
+    # rolled back (or closed without a commit): the logged change didn't happen
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+def shutdown() -> None:
+    _writer.close()
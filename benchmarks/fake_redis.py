@@ -0,0 +1,131 @@
+# tiny in-memory Redis-protocol server for tests and load runs without a real Redis:
+# PING, GET, SET (EX/PX/NX), DEL, EXISTS, SCAN, DBSIZE, FLUSHDB, SELECT, AUTH.
+#
+#   python -m benchmarks.fake_redis --port 6390
+#   CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6390/0
+
+import argparse
+import asyncio
+import fnmatch
+import time
+
+# key -> (value, expires at (monotonic) or None)
+_data: dict[bytes, tuple[bytes, float | None]] = {}
+
+
+def _alive(key: bytes):
+    entry = _data.get(key)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if expires_at is not None and expires_at <= time.monotonic():
+        del _data[key]
+        return None
+    return value
+
+
+def _encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return b"-ERR %s\r\n" % str(reply).encode()
+    if isinstance(reply, str):
+        return b"+%s\r\n" % reply.encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+
+
+def _set(args: list[bytes]):
+    key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+    expires_at = None
+    for i, option in enumerate(options):
+        if option == b"EX":
+            expires_at = time.monotonic() + int(args[2 + i + 1])
+        elif option == b"PX":
+            expires_at = time.monotonic() + int(args[2 + i + 1]) / 1000
+    if b"NX" in options and _alive(key) is not None:
+        return None
+    _data[key] = (value, expires_at)
+    return "OK"
+
+
+def _scan(args: list[bytes]):
+    cursor = int(args[0])
+    pattern, count = b"*", 10
+    for i in range(1, len(args) - 1, 2):
+        if args[i].upper() == b"MATCH":
+            pattern = args[i + 1]
+        elif args[i].upper() == b"COUNT":
+            count = int(args[i + 1])
+    keys = sorted(_data)
+    page = keys[cursor:cursor + count]
+    next_cursor = cursor + count if cursor + count < len(keys) else 0
+    matched = [k for k in page if _alive(k) is not None and fnmatch.fnmatchcase(k.decode(), pattern.decode())]
+    return [str(next_cursor).encode(), matched]
+
+
+def execute(command: list[bytes]):
+    name, args = command[0].upper(), command[1:]
+    if name == b"PING":
+        return "PONG"
+    if name == b"GET":
+        return _alive(args[0])
+    if name == b"SET":
+        return _set(args)
+    if name == b"DEL":
+        return sum(1 for key in args if _alive(key) is not None and _data.pop(key, None) is not None)
+    if name == b"EXISTS":
+        return sum(1 for key in args if _alive(key) is not None)
+    if name == b"SCAN":
+        return _scan(args)
+    if name == b"DBSIZE":
+        return len(_data)
+    if name == b"FLUSHDB":
+        _data.clear()
+        return "OK"
+    if name in (b"SELECT", b"AUTH"):
+        return "OK"
+    return Exception(f"unknown command '{name.decode()}'")
+
+
+async def _read_command(reader: asyncio.StreamReader) -> list[bytes]:
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError
+    if not line.startswith(b"*"):
+        return line.split()  # inline command (e.g. typed into telnet)
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            command = await _read_command(reader)
+            if command:
+                writer.write(_encode(execute(command)))
+                await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main(host: str, port: int) -> None:
+    server = await asyncio.start_server(_serve, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port))
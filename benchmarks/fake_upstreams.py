@@ -0,0 +1,195 @@
+# local stand-ins for Twelve Data and OpenAI, with tunable latency, so load tests never hit the real services.
+#
+#   python -m benchmarks.fake_upstreams --port 9100 --quote-latency-ms 80 --llm-first-token-ms 400
+#
+# then point the API at it:
+#   TWELVE_DATA_BASE_URL=http://127.0.0.1:9100/twelvedata
+#   OPENAI_BASE_URL=http://127.0.0.1:9100/openai/v1  OPENAI_API_KEY=fake
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+QUOTE_LATENCY_MS = float(os.getenv("FAKE_QUOTE_LATENCY_MS", "80"))
+LLM_FIRST_TOKEN_MS = float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "400"))
+LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "15"))
+LLM_REPLY_TOKENS = int(os.getenv("FAKE_LLM_REPLY_TOKENS", "120"))
+# per-minute quotas like the real plans (0 = unlimited), to see how the API behaves once they run out
+TWELVE_DATA_CREDITS_PER_MINUTE = int(os.getenv("FAKE_TWELVE_DATA_CREDITS_PER_MINUTE", "0"))
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("FAKE_OPENAI_REQUESTS_PER_MINUTE", "0"))
+
+app = FastAPI()
+# counts upstream calls so a benchmark can report how many actually reached the "provider"
+calls = {"quote": 0, "quote_symbols": 0, "time_series": 0, "time_series_bars": 0, "chat": 0, "throttled": 0}
+_prices: dict[str, float] = {}
+# (provider, minute) -> quota used
+_usage: dict[tuple, int] = {}
+
+
+def _over_quota(provider: str, limit: int, cost: int = 1) -> bool:
+    if not limit:
+        return False
+    key = (provider, int(time.time() // 60))
+    if _usage.get(key, 0) + cost > limit:
+        calls["throttled"] += 1
+        return True
+    _usage[key] = _usage.get(key, 0) + cost
+    return False
+
+
+def _twelve_data_limit() -> dict:
+    # Twelve Data answers 200 with an error payload
+    return {
+        "code": 429,
+        "message": "You have run out of API credits for the current minute. Wait for the next minute.",
+        "status": "error",
+    }
+
+
+def _jitter(ms: float) -> float:
+    return max(0.0, random.gauss(ms, ms * 0.1)) / 1000
+
+
+def _quote(symbol: str) -> dict:
+    price = _prices.get(symbol, random.uniform(10, 150))
+    previous = price
+    price = round(price * (1 + random.gauss(0, 0.002)), 2)
+    _prices[symbol] = price
+    return {
+        "symbol": symbol,
+        "name": f"{symbol} Company",
+        "exchange": "Tadawul",
+        "currency": "SAR",
+        "price": str(price),
+        "close": str(price),
+        "previous_close": str(previous),
+        "percent_change": str(round((price / previous - 1) * 100, 4)),
+    }
+
+
+@app.get("/twelvedata/quote")
+async def quote(symbol: str, apikey: str = ""):
+    symbols = [s for s in symbol.split(",") if s]
+    if _over_quota("twelvedata", TWELVE_DATA_CREDITS_PER_MINUTE, len(symbols)):
+        return _twelve_data_limit()
+    calls["quote"] += 1
+    calls["quote_symbols"] += len(symbols)
+    await asyncio.sleep(_jitter(QUOTE_LATENCY_MS))
+    if len(symbols) == 1:
+        return _quote(symbols[0])
+    return {s: _quote(s) for s in symbols}
+
+
+_STEP = {"1min": 60, "5min": 300, "15min": 900, "30min": 1800, "1h": 3600, "4h": 14400, "1day": 86400,
+         "1week": 604800, "1month": 2592000}
+
+
+@app.get("/twelvedata/time_series")
+async def time_series(symbol: str, interval: str = "1day", start_date: str = "", outputsize: int = 5000,
+                      apikey: str = "", timezone: str = "UTC", order: str = "ASC"):
+    # deterministic random walk per symbol, ending at the current bar
+    if _over_quota("twelvedata", TWELVE_DATA_CREDITS_PER_MINUTE):
+        return _twelve_data_limit()
+    calls["time_series"] += 1
+    await asyncio.sleep(_jitter(QUOTE_LATENCY_MS))
+    step = _STEP.get(interval, 86400)
+    now = int(time.time()) // step * step
+    first = now - (outputsize - 1) * step
+    if start_date:
+        first = max(first, int(datetime.fromisoformat(start_date).replace(tzinfo=dt_timezone.utc).timestamp()))
+    if first > now:
+        return {"code": 400, "message": "No data is available on the specified dates.", "status": "error"}
+
+    rng = random.Random(symbol)
+    price = rng.uniform(10, 150)
+    values = []
+    for t in range(now - 4999 * step, now + step, step):
+        open_ = price
+        price = max(0.01, price * (1 + rng.gauss(0.0003, 0.015)))
+        if t >= first:
+            values.append({
+                "datetime": datetime.fromtimestamp(t, dt_timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "open": f"{open_:.4f}", "high": f"{max(open_, price) * 1.005:.4f}",
+                "low": f"{min(open_, price) * 0.995:.4f}", "close": f"{price:.4f}",
+                "volume": str(rng.randint(10_000, 1_000_000)),
+            })
+    calls["time_series_bars"] += len(values)
+    if order.upper() == "DESC":
+        values.reverse()
+    return {"meta": {"symbol": symbol, "interval": interval}, "values": values, "status": "ok"}
+
+
+def _reply_tokens() -> list[str]:
+    return [f"word{i} " for i in range(LLM_REPLY_TOKENS)]
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if _over_quota("openai", OPENAI_REQUESTS_PER_MINUTE):
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after-ms": str(int((60 - time.time() % 60) * 1000))},
+        )
+    calls["chat"] += 1
+    prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(_jitter(LLM_FIRST_TOKEN_MS) + LLM_REPLY_TOKENS * LLM_TOKEN_MS / 1000)
+        return JSONResponse({
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "".join(_reply_tokens())}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": LLM_REPLY_TOKENS,
+                      "total_tokens": prompt_tokens + LLM_REPLY_TOKENS},
+        })
+
+    async def events():
+        await asyncio.sleep(_jitter(LLM_FIRST_TOKEN_MS))
+        for token in _reply_tokens():
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                     "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(LLM_TOKEN_MS / 1000)
+        if body.get("stream_options", {}).get("include_usage"):
+            usage = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                     "model": body.get("model"), "choices": [],
+                     "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": LLM_REPLY_TOKENS,
+                               "total_tokens": prompt_tokens + LLM_REPLY_TOKENS}}
+            yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/calls")
+def get_calls():
+    return calls
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Twelve Data + OpenAI servers for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--quote-latency-ms", type=float, default=QUOTE_LATENCY_MS)
+    parser.add_argument("--llm-first-token-ms", type=float, default=LLM_FIRST_TOKEN_MS)
+    parser.add_argument("--llm-token-ms", type=float, default=LLM_TOKEN_MS)
+    parser.add_argument("--twelve-data-credits-per-minute", type=int, default=TWELVE_DATA_CREDITS_PER_MINUTE)
+    parser.add_argument("--openai-requests-per-minute", type=int, default=OPENAI_REQUESTS_PER_MINUTE)
+    args = parser.parse_args()
+    TWELVE_DATA_CREDITS_PER_MINUTE = args.twelve_data_credits_per_minute
+    OPENAI_REQUESTS_PER_MINUTE = args.openai_requests_per_minute
+    QUOTE_LATENCY_MS, LLM_FIRST_TOKEN_MS, LLM_TOKEN_MS = args.quote_latency_ms, args.llm_first_token_ms, args.llm_token_ms
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
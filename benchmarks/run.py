@@ -0,0 +1,215 @@
+# load-test runner: p50/p95/p99 latency and throughput per endpoint, compared against a stored baseline.
+#
+# against an already running API:
+#   python -m benchmarks.run --base-url http://127.0.0.1:8000 --users 100
+#
+# or start everything locally (fake upstreams, seeded SQLite database, the API) first:
+#   python -m benchmarks.run --start-stack --scale small --save-baseline benchmarks/baseline.json
+#   python -m benchmarks.run --start-stack --scale small --baseline benchmarks/baseline.json
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from benchmarks.scenarios import SCENARIOS, Recorder
+from benchmarks.seed import SCALES
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    # nearest rank
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(recorder: Recorder, duration: float) -> dict:
+    report = {}
+    for label, samples in sorted(recorder.samples.items()):
+        values = sorted(samples)
+        report[label] = {
+            "count": len(values),
+            "errors": recorder.errors[label],
+            "rps": len(values) / duration,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    return report
+
+
+async def run_scenario(base_url: str, scenario_cls, users: int, concurrency: int, duration: float) -> dict:
+    scenario = scenario_cls(users)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        # setup (e.g. logging in) isn't part of the measurement
+        states = await asyncio.gather(*(scenario.setup(client, Recorder(), worker) for worker in range(concurrency)))
+        deadline = time.perf_counter() + duration
+
+        async def worker(state):
+            while time.perf_counter() < deadline:
+                await scenario.step(client, recorder, state)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(state) for state in states))
+        elapsed = time.perf_counter() - started
+
+    return summarize(recorder, elapsed)
+
+
+def print_report(name: str, report: dict) -> None:
+    print(f"\n== {name}")
+    print(f"{'endpoint':<40} {'count':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, r in report.items():
+        print(f"{label:<40} {r['count']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    An endpoint regressed when its p95 grew, or its throughput dropped, by more than `tolerance`.
+    """
+    regressions = []
+    for scenario, endpoints in results.items():
+        for label, current in endpoints.items():
+            before = baseline.get(scenario, {}).get(label)
+            if before is None:
+                continue
+            if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{scenario} {label}: p95 {before['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+            if current["rps"] < before["rps"] * (1 - tolerance):
+                regressions.append(f"{scenario} {label}: throughput {before['rps']:.1f} -> {current['rps']:.1f} rps")
+    return regressions
+
+
+def _wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+
+@contextmanager
+def local_stack(args):
+    """
+    Fake upstreams + freshly seeded database + the API under uvicorn, torn down afterwards.
+    """
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.db_url,
+        TWELVE_DATA_BASE_URL=f"http://127.0.0.1:{args.fake_port}/twelvedata",
+        TWELVE_DATA_API_KEY="fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_port}/openai/v1",
+        OPENAI_API_KEY="fake",
+        CACHE_BACKEND=args.cache_backend,
+    )
+    if args.cache_backend == "sqlite":
+        env["CACHE_SQLITE_PATH"] = "benchmarks/cache.db"
+    elif args.cache_backend == "redis":
+        env["CACHE_REDIS_URL"] = f"redis://127.0.0.1:{args.redis_port}/0"
+    processes = []
+    try:
+        subprocess.run([sys.executable, "-m", "benchmarks.seed", "--db-url", args.db_url, "--scale", args.scale],
+                       env=env, check=True)
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(args.fake_port),
+             "--quote-latency-ms", str(args.quote_latency_ms), "--llm-first-token-ms", str(args.llm_first_token_ms)],
+            env=env,
+        ))
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.api_port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env=env,
+        ))
+        if args.cache_backend == "redis":
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.fake_redis", "--port", str(args.redis_port)], env=env,
+            ))
+            _wait_for_port(args.redis_port)
+        _wait_for_port(args.fake_port)
+        _wait_for_port(args.api_port)
+        yield f"http://127.0.0.1:{args.api_port}"
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the RZK API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default="all", help=f"comma separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--users", type=int, help="seeded users to log in as (defaults to the scale's user count)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20, help="seconds per scenario")
+    parser.add_argument("--baseline", help="compare against this stored result, exit 1 on regression")
+    parser.add_argument("--save-baseline", help="store this run's results here")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", help="write the full results as JSON")
+
+    stack = parser.add_argument_group("local stack")
+    stack.add_argument("--start-stack", action="store_true")
+    stack.add_argument("--scale", choices=sorted(SCALES), default="small")
+    stack.add_argument("--db-url", default="sqlite:///benchmarks/bench.db")
+    stack.add_argument("--api-port", type=int, default=8765)
+    stack.add_argument("--fake-port", type=int, default=9100)
+    stack.add_argument("--workers", type=int, default=1)
+    stack.add_argument("--cache-backend", choices=("memory", "sqlite", "redis"), default="memory",
+                       help="redis starts the local stand-in from benchmarks/fake_redis.py")
+    stack.add_argument("--redis-port", type=int, default=6390)
+    stack.add_argument("--quote-latency-ms", type=float, default=80)
+    stack.add_argument("--llm-first-token-ms", type=float, default=400)
+    args = parser.parse_args()
+
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    users = args.users or SCALES[args.scale][0]
+
+    def run_all(base_url: str) -> dict:
+        results = {}
+        for name in names:
+            results[name] = asyncio.run(run_scenario(base_url, SCENARIOS[name], users, args.concurrency, args.duration))
+            print_report(name, results[name])
+        return results
+
+    if args.start_stack:
+        with local_stack(args) as base_url:
+            results = run_all(base_url)
+    else:
+        results = run_all(args.base_url)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nbaseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nno regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
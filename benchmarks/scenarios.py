@@ -0,0 +1,107 @@
+# scripted load-test scenarios. each virtual user runs setup() once, then step() in a loop.
+
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Optional
+
+import httpx
+
+from benchmarks.seed import BENCH_PASSWORD, bench_email
+
+CHAT_QUESTIONS = [
+    "Which Saudi stocks should I invest in?",
+    "which saudi stocks should i invest in",
+    "ما هي الأسهم السعودية التي يجب أن أستثمر فيها؟",
+    "Is Aramco a good long term investment?",
+    "How much should I save every month for a car in two years?",
+]
+
+
+class Recorder:
+    """
+    Latency samples (seconds) and error counts per endpoint label.
+    """
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+
+    async def request(self, client: httpx.AsyncClient, method: str, url: str, label: Optional[str] = None, **kwargs):
+        label = label or f"{method} {url.split('?')[0]}"
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.samples[label].append(time.perf_counter() - started)
+            self.errors[label] += 1
+            return None
+        self.samples[label].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+
+async def login(client: httpx.AsyncClient, recorder: Recorder, user_number: int) -> Optional[str]:
+    response = await recorder.request(
+        client, "POST", "/user/login", json={"email": bench_email(user_number), "password": BENCH_PASSWORD}
+    )
+    if response is None or response.status_code != 200:
+        return None
+    return response.json()["access_token"]
+
+
+class Scenario:
+    name = ""
+
+    def __init__(self, users: int):
+        self.users = users
+
+    async def setup(self, client: httpx.AsyncClient, recorder: Recorder, worker: int) -> dict:
+        return {}
+
+    async def step(self, client: httpx.AsyncClient, recorder: Recorder, state: dict) -> None:
+        raise NotImplementedError
+
+
+class AuthenticatedScenario(Scenario):
+    async def setup(self, client, recorder, worker):
+        token = await login(client, recorder, worker % self.users + 1)
+        return {"headers": {"Authorization": f"Bearer {token}"}}
+
+
+class LoginStorm(Scenario):
+    name = "login_storm"
+
+    async def step(self, client, recorder, state):
+        await login(client, recorder, random.randint(1, self.users))
+
+
+class DashboardRefresh(AuthenticatedScenario):
+    name = "dashboard_refresh"
+
+    async def step(self, client, recorder, state):
+        await recorder.request(client, "GET", "/dashboard/dashboard", headers=state["headers"])
+        await recorder.request(client, "GET", "/transaction/transactions/?limit=50", headers=state["headers"])
+
+
+class WatchlistPricing(AuthenticatedScenario):
+    name = "watchlist_pricing"
+
+    async def step(self, client, recorder, state):
+        response = await recorder.request(client, "GET", "/stocks/watchlist", headers=state["headers"])
+        if response is None or response.status_code != 200:
+            return
+        symbols = ",".join(item["symbol"] for item in response.json())
+        if symbols:
+            await recorder.request(client, "GET", f"/stocks/quotes?symbols={symbols}", headers=state["headers"])
+
+
+class ChatBurst(Scenario):
+    name = "chat_burst"
+
+    async def step(self, client, recorder, state):
+        await recorder.request(client, "POST", "/ai/chat", json={"message": random.choice(CHAT_QUESTIONS)})
+
+
+SCENARIOS = {cls.name: cls for cls in (LoginStorm, DashboardRefresh, WatchlistPricing, ChatBurst)}
@@ -0,0 +1,130 @@
+# seeds users, savings goals, transactions and watchlists for load tests.
+#
+#   python -m benchmarks.seed --db-url sqlite:///benchmarks/bench.db --scale small
+#
+# every user is bench{n}@example.com with password BENCH_PASSWORD.
+
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+BENCH_PASSWORD = "bench-password"
+
+SYMBOLS = [
+    "2222.SR", "1120.SR", "2010.SR", "7010.SR", "1180.SR", "2380.SR", "4200.SR", "1211.SR",
+    "2350.SR", "4001.SR", "1150.SR", "2020.SR", "4280.SR", "7020.SR", "2280.SR", "1060.SR",
+    "4190.SR", "2082.SR", "1010.SR", "4013.SR", "2290.SR", "8210.SR", "4030.SR", "2050.SR",
+]
+
+# users, goals per user, transactions per user, watchlist symbols per user
+SCALES = {
+    "small": (100, 5, 50, 5),
+    "medium": (1_000, 10, 500, 10),
+    "large": (2_000, 20, 2_000, 20),
+}
+
+CHUNK = 5_000
+
+
+def bench_email(n: int) -> str:
+    return f"bench{n}@example.com"
+
+
+def _insert(db, model, rows: list[dict]) -> None:
+    from sqlalchemy import insert
+
+    for i in range(0, len(rows), CHUNK):
+        db.execute(insert(model), rows[i:i + CHUNK])
+    db.commit()
+
+
+def seed(scale: str, seed_value: int = 1) -> dict:
+    # imported here so --db-url is in the environment before the engine is created
+    from app.db.database import Base, SessionLocal, engine
+    from app.models import chat  # noqa: F401 (not seeded, but its tables reference users)
+    from app.models.savings import SavingsGoal
+    from app.models.savings_summary import SavingsSummary
+    from app.models.transaction import Transaction
+    from app.models.user import User
+    from app.models.watchlist import WatchlistItem
+    from app.services.passwords import get_context
+
+    users, goals_per_user, tx_per_user, watch_per_user = SCALES[scale]
+    rng = random.Random(seed_value)
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    # hashing is the slow part, every user shares one hash of the same password
+    password_hash = get_context().hash(BENCH_PASSWORD)
+    today = date.today()
+    now = datetime.utcnow()
+
+    db = SessionLocal()
+    try:
+        _insert(db, User, [{
+            "id": n, "name": f"Bench User {n}", "email": bench_email(n), "phone_number": "0500000000",
+            "password_hash": password_hash, "savings": rng.uniform(0, 50_000),
+            "birthday": date(1995, 1, 1), "savings_goal": 10_000.0, "current_savings": 0.0,
+        } for n in range(1, users + 1)])
+
+        goals = []
+        goal_id = 0
+        for n in range(1, users + 1):
+            for _ in range(goals_per_user):
+                goal_id += 1
+                target = rng.choice([5_000, 10_000, 25_000, 100_000])
+                goals.append({
+                    "id": goal_id, "user_id": n, "goal_name": f"Goal {goal_id}",
+                    "target_amount": float(target), "target_date": today + timedelta(days=rng.randint(90, 3650)),
+                    "current_amount": round(rng.uniform(0, target * 1.2), 2),
+                    "investing": rng.random() < 0.5, "expected_return": rng.choice([3.0, 5.0, 7.0, 9.0]),
+                    "interest_type": rng.choice(["compound", "simple"]),
+                    "risk_tolerance": rng.choice(["considerate", "medium", "high"]),
+                })
+        _insert(db, SavingsGoal, goals)
+
+        summaries = {}
+        for g in goals:
+            s = summaries.setdefault(g["user_id"], {"user_id": g["user_id"], "total_saved": 0.0, "active_goals": 0, "goal_count": 0})
+            s["total_saved"] += g["current_amount"]
+            s["active_goals"] += int(g["current_amount"] < g["target_amount"])
+            s["goal_count"] += 1
+        _insert(db, SavingsSummary, list(summaries.values()))
+
+        for start in range(1, users + 1, 200):
+            transactions = []
+            for n in range(start, min(start + 200, users + 1)):
+                for _ in range(tx_per_user):
+                    transactions.append({
+                        "user_id": n, "savings_goal_id": None,
+                        "type": rng.choice(["deposit", "withdrawal", "progress_update"]),
+                        "amount": round(rng.uniform(5, 2_000), 2), "description": "seeded",
+                        "timestamp": now - timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 3)),
+                    })
+            _insert(db, Transaction, transactions)
+
+        _insert(db, WatchlistItem, [
+            {"user_id": n, "symbol": symbol, "company_name": f"{symbol} Company"}
+            for n in range(1, users + 1)
+            for symbol in rng.sample(SYMBOLS, min(watch_per_user, len(SYMBOLS)))
+        ])
+    finally:
+        db.close()
+
+    return {"users": users, "goals": len(goals), "transactions": users * tx_per_user}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a database for load testing")
+    parser.add_argument("--db-url", default=os.getenv("DATABASE_URL", "sqlite:///benchmarks/bench.db"))
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.db_url
+    started = time.perf_counter()
+    counts = seed(args.scale, args.seed)
+    print(f"seeded {counts} into {args.db_url} in {time.perf_counter() - started:.1f}s")